@@ -11,6 +11,7 @@ import logging
 import warnings
 import threading
 import gc
+import atexit
 from flask import Flask, jsonify
 from flask_jwt_extended import JWTManager
 from flask_cors import CORS
@@ -57,6 +58,11 @@ if hasattr(config, 'HANLP_MODEL_DIR') and config.HANLP_MODEL_DIR:
 from src.utils.helpers import setup_logging, EmotionAnalysisError
 from src.core.cemotion import Cemotion
 from src.core.segmentor import TextSegmentor
+from src.core.batcher import DynamicBatcher
+from src.core.pool import InferencePool
+from src.auth.last_used import last_used_recorder
+from src.auth.quota_ledger import quota_ledger
+from src.api.audit_log import audit_log_writer
 from src.api.routes import register_routes
 from src.api.auth_routes import auth_bp
 from src.database.manager import DatabaseManager
@@ -276,6 +282,22 @@ except Exception as e:
     logger.error(f"情感分析器初始化失败: {e}")
     emotion_analyzer = None
 
+# 初始化动态批处理器（合并并发的单文本请求）
+prediction_batcher = None
+if emotion_analyzer and config.DYNAMIC_BATCHING_ENABLED:
+    try:
+        prediction_batcher = DynamicBatcher(
+            emotion_analyzer.predict_batch,
+            max_batch_size=config.DYNAMIC_BATCH_MAX_SIZE,
+            max_wait_ms=config.DYNAMIC_BATCH_MAX_WAIT_MS,
+            timeout=config.REQUEST_TIMEOUT
+        )
+        # 退出时处理完已入队的请求
+        atexit.register(prediction_batcher.shutdown)
+    except Exception as e:
+        logger.error(f"动态批处理器初始化失败: {e}")
+        prediction_batcher = None
+
 # 初始化文本分词器
 try:
     text_segmentor = TextSegmentor(config=config)
@@ -284,8 +306,45 @@ except Exception as e:
     logger.error(f"文本分词器初始化失败: {e}", exc_info=True)
     text_segmentor = None
 
+# 初始化多进程推理池（子进程各自加载模型，父进程只负责分块和合并）
+inference_pool = None
+if config.PROCESS_POOL_ENABLED and (emotion_analyzer or text_segmentor):
+    try:
+        inference_pool = InferencePool(
+            max_workers=config.MAX_WORKERS,
+            load_sentiment=emotion_analyzer is not None,
+            load_segment=text_segmentor is not None,
+            min_items=config.PROCESS_POOL_MIN_ITEMS,
+            timeout=config.REQUEST_TIMEOUT
+        )
+        if emotion_analyzer:
+            emotion_analyzer.process_pool = inference_pool
+        if text_segmentor:
+            text_segmentor.process_pool = inference_pool
+        atexit.register(inference_pool.shutdown, wait=False)
+    except Exception as e:
+        logger.error(f"多进程推理池初始化失败: {e}")
+        inference_pool = None
+
 # 注册路由
-register_routes(app, emotion_analyzer, text_segmentor)
+register_routes(app, emotion_analyzer, text_segmentor, prediction_batcher, inference_pool)
+
+# 启动API密钥最后使用时间的延迟写入，退出时写入剩余记录
+last_used_recorder.start(app)
+atexit.register(last_used_recorder.stop)
+
+# 启动配额账本（可选）：重放上次未同步的扣减日志，退出时同步剩余增量
+if config.QUOTA_LEDGER_ENABLED:
+    try:
+        quota_ledger.start(app)
+        atexit.register(quota_ledger.stop)
+    except Exception as e:
+        logger.error(f"配额账本启动失败，改为直接在数据库中扣减配额: {e}")
+
+# 启动API调用记录的异步批量写入，退出时写入队列中剩余的记录
+if config.AUDIT_LOG_ASYNC_ENABLED:
+    audit_log_writer.start(app)
+    atexit.register(audit_log_writer.stop)
 
 # 定期清理线程
 def cleanup_thread():
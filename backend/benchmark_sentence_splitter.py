@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+分句性能基准脚本
+对比共享分句模块与原有分句路径（HanLP split_sentence、分词器内的正则分句）的耗时
+
+共享分句规则比原有正则多识别英文标点和右引号，切分结果不同；为了在相同工作量下比较，
+另外计时一个用原有finditer循环执行共享规则的实现，计时前断言它与共享分句结果完全一致。
+其他路径与共享分句的结果差异在报告中逐项列出。
+
+用法:
+    python benchmark_sentence_splitter.py                  # 默认约10万字符的测试文本
+    python benchmark_sentence_splitter.py --chars 1000000  # 指定测试文本长度
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import argparse
+
+# 添加项目路径
+project_root = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, project_root)
+
+from src.utils.sentence_splitter import SENTENCE_END, split_sentences, iter_sentences
+
+SAMPLE_PARAGRAPH = (
+    "这家餐厅的环境很好，服务员也很热情！菜品味道一般，价格偏贵……"
+    "朋友说：“下次不来了。”我觉得还行吧？总体评价3.5分；推荐指数中等。\n"
+    "The room was clean. Staff were friendly!\n"
+)
+
+
+def legacy_hanlp_split(text):
+    """原情感分析路径：HanLP split_sentence 后去除空白"""
+    from hanlp.utils.rules import split_sentence
+    return [s.strip() for s in split_sentence(text) if s.strip()]
+
+
+def legacy_segmentor_split(text):
+    """原分词器路径：每次调用编译正则并按标点切分"""
+    sentence_delimiters = re.compile(r'([。！？；\n])')
+    sentences = []
+    start = 0
+    for match in sentence_delimiters.finditer(text):
+        sentences.append(text[start:match.end()])
+        start = match.end()
+    if start < len(text):
+        sentences.append(text[start:])
+    return sentences
+
+
+def finditer_shared_rules(text):
+    """原分词器路径的finditer循环，使用共享分句规则（与shared_splitter_keep_whitespace结果一致）"""
+    sentences = []
+    start = 0
+    for match in SENTENCE_END.finditer(text):
+        sentences.append(text[start:match.end()])
+        start = match.end()
+    if start < len(text):
+        sentences.append(text[start:])
+    return sentences
+
+
+def compare(result, reference):
+    """与参照结果比较，返回差异说明"""
+    if result == reference:
+        return {'same_as_reference': True}
+    first_diff = next(
+        (i for i, (a, b) in enumerate(zip(result, reference)) if a != b),
+        min(len(result), len(reference))
+    )
+    return {
+        'same_as_reference': False,
+        'sentence_count_delta': len(result) - len(reference),
+        'first_difference_index': first_diff
+    }
+
+
+def timed(fn, text, rounds):
+    """多轮执行取平均耗时，返回(句子数, 平均耗时毫秒)"""
+    result = fn(text)
+    start_time = time.perf_counter()
+    for _ in range(rounds):
+        fn(text)
+    elapsed = (time.perf_counter() - start_time) / rounds
+    return len(result), round(elapsed * 1000, 3)
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='分句性能基准')
+    parser.add_argument('--chars', type=int, default=100000, help='测试文本长度（字符）')
+    parser.add_argument('--rounds', type=int, default=20, help='计时轮数')
+    args = parser.parse_args()
+
+    repeat = max(1, args.chars // len(SAMPLE_PARAGRAPH))
+    text = SAMPLE_PARAGRAPH * repeat
+
+    # 名称 -> (分句函数, 参照的共享分句路径)；去除空白的路径与split_sentences比较，保留空白的与iter_sentences比较
+    candidates = {
+        'shared_splitter': (split_sentences, 'shared_splitter'),
+        'shared_splitter_keep_whitespace': (lambda t: list(iter_sentences(t)), 'shared_splitter_keep_whitespace'),
+        'finditer_shared_rules': (finditer_shared_rules, 'shared_splitter_keep_whitespace'),
+        'legacy_segmentor_regex': (legacy_segmentor_split, 'shared_splitter_keep_whitespace'),
+    }
+    report = {'text_length': len(text), 'rounds': args.rounds, 'results': {}}
+    try:
+        import hanlp.utils.rules  # noqa: F401
+        candidates['legacy_hanlp_split_sentence'] = (legacy_hanlp_split, 'shared_splitter')
+    except ImportError:
+        report['hanlp'] = 'not installed, legacy_hanlp_split_sentence skipped'
+        print("未安装hanlp，跳过HanLP split_sentence对比", file=sys.stderr)
+
+    references = {
+        'shared_splitter': split_sentences(text),
+        'shared_splitter_keep_whitespace': list(iter_sentences(text)),
+    }
+    # 相同工作量的对照组必须与共享分句结果完全一致
+    assert finditer_shared_rules(text) == references['shared_splitter_keep_whitespace'], \
+        "finditer_shared_rules与共享分句结果不一致"
+
+    for name, (fn, reference) in candidates.items():
+        count, latency = timed(fn, text, args.rounds)
+        entry = {'sentence_count': count, 'latency_ms': latency, 'reference': reference}
+        entry.update(compare(fn(text), references[reference]))
+        report['results'][name] = entry
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
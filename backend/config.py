@@ -62,6 +62,14 @@ class Config:
     MODEL_DOWNLOAD_STRATEGY = os.getenv('MODEL_DOWNLOAD_STRATEGY', 'cn_priority')  # 'auto', 'cn_priority', 'global_priority'
     MODEL_DOWNLOAD_TIMEOUT = int(os.getenv('MODEL_DOWNLOAD_TIMEOUT', '300'))  # 下载超时时间(秒)，增加到300秒（5分钟）
     MODEL_DOWNLOAD_RETRIES = int(os.getenv('MODEL_DOWNLOAD_RETRIES', '5'))  # 下载重试次数
+    MODEL_VERSION = os.getenv('MODEL_VERSION', 'cemotion-2.0')  # 模型版本标识，参与结果缓存键计算
+
+    # 推理后端配置
+    INFERENCE_BACKEND = os.getenv('INFERENCE_BACKEND', 'torch').lower()  # 'torch' 或 'onnx'（需安装onnxruntime）
+    ONNX_MODEL_PATH = os.getenv('ONNX_MODEL_PATH', '')  # 为空时导出到cemotion权重文件同目录下的cemotion_2.0.onnx
+    ONNX_TOLERANCE = float(os.getenv('ONNX_TOLERANCE', '0.001'))  # ONNX与PyTorch分数允许的最大差异
+    QUANTIZATION_MODE = os.getenv('QUANTIZATION_MODE', 'none').lower()  # 'none' 或 'dynamic_int8'（仅PyTorch后端CPU推理）
+    QUANTIZED_MODEL_PATH = os.getenv('QUANTIZED_MODEL_PATH', '')  # 预量化模型路径，存在时跳过浮点权重加载
 
     # Hugging Face配置
     HF_CACHE_DIR = os.getenv('HF_HOME', '/app/.cache/huggingface')
@@ -73,13 +81,60 @@ class Config:
     # API配置
     MAX_TEXT_LENGTH = int(os.getenv('MAX_TEXT_LENGTH', '2048'))  # 增加到2048字符以支持更长文本
     BATCH_SIZE = int(os.getenv('BATCH_SIZE', '16'))
+    SEGMENT_BATCH_SIZE = int(os.getenv('SEGMENT_BATCH_SIZE', '32'))  # 单次送入HanLP分词的最大文本数
+    SEGMENT_CHUNK_OVERLAP = int(os.getenv('SEGMENT_CHUNK_OVERLAP', '0'))  # 长文本分词时块边界两侧的上下文字符数，0表示不重叠
+    SEGMENT_DICT_PATH = os.getenv('SEGMENT_DICT_PATH', '')  # 词典分词引擎的词典文件（每行：词 词频 [词性]），为空时不启用
+    SEGMENT_DICT_PLANS = os.getenv('SEGMENT_DICT_PLANS', '')  # 默认使用词典分词引擎的套餐名称，逗号分隔
     REQUEST_TIMEOUT = int(os.getenv('REQUEST_TIMEOUT', '30'))
+    API_KEY_CACHE_TTL = int(os.getenv('API_KEY_CACHE_TTL', '60'))  # API Key解析结果的缓存时间(秒)，0表示不缓存
+    API_KEY_CACHE_SIZE = int(os.getenv('API_KEY_CACHE_SIZE', '10000'))  # API Key解析缓存的最大条目数
+    # 配额账本：在内存中扣减配额，扣减日志保证崩溃后不丢失，定期批量同步到数据库
+    QUOTA_LEDGER_ENABLED = os.getenv('QUOTA_LEDGER_ENABLED', 'false').lower() == 'true'
+    QUOTA_LEDGER_JOURNAL_DIR = os.getenv('QUOTA_LEDGER_JOURNAL_DIR', os.path.join('instance', 'quota_journal'))
+    QUOTA_LEDGER_RECONCILE_INTERVAL = float(os.getenv('QUOTA_LEDGER_RECONCILE_INTERVAL', '2'))  # 同步到数据库的间隔(秒)
+    # API调用记录异步写入：请求只入队，后台线程批量插入
+    AUDIT_LOG_ASYNC_ENABLED = os.getenv('AUDIT_LOG_ASYNC_ENABLED', 'true').lower() == 'true'
+    AUDIT_LOG_QUEUE_SIZE = int(os.getenv('AUDIT_LOG_QUEUE_SIZE', '10000'))  # 队列容量，满时丢弃并计数
+    AUDIT_LOG_BATCH_SIZE = int(os.getenv('AUDIT_LOG_BATCH_SIZE', '200'))  # 单次插入的最大记录数
+    AUDIT_LOG_FLUSH_MS = float(os.getenv('AUDIT_LOG_FLUSH_MS', '200'))  # 攒批的最长等待时间(毫秒)
+    AUDIT_LOG_PUT_TIMEOUT_MS = float(os.getenv('AUDIT_LOG_PUT_TIMEOUT_MS', '10'))  # 队列满时请求的最长等待时间(毫秒)
+    LAST_USED_FLUSH_INTERVAL = float(os.getenv('LAST_USED_FLUSH_INTERVAL', '5'))  # API密钥最后使用时间的批量写入间隔(秒)，0表示每次请求直接写入
 
     # 性能配置
     LRU_CACHE_SIZE = int(os.getenv('LRU_CACHE_SIZE', '1000'))
+    RESULT_CACHE_ENABLED = os.getenv('RESULT_CACHE_ENABLED', 'true').lower() == 'true'  # 是否启用分析结果缓存
+    SEGMENT_CACHE_SIZE = int(os.getenv('SEGMENT_CACHE_SIZE', '1000'))  # 分词结果缓存容量
+    SEGMENT_SENTENCE_CACHE_SIZE = int(os.getenv('SEGMENT_SENTENCE_CACHE_SIZE', '10000'))  # 长文本句子级分词缓存容量，0表示不启用
+    # 跨worker共享结果缓存（SQLite WAL文件），位于进程内LRU与模型之间
+    SHARED_CACHE_ENABLED = os.getenv('SHARED_CACHE_ENABLED', 'false').lower() == 'true'
+    SHARED_CACHE_PATH = os.getenv('SHARED_CACHE_PATH', os.path.join('instance', 'result_cache.db'))
+    SHARED_CACHE_TTL = int(os.getenv('SHARED_CACHE_TTL', '86400'))  # 条目有效期(秒)
+    SHARED_CACHE_MAX_ENTRIES = int(os.getenv('SHARED_CACHE_MAX_ENTRIES', '100000'))  # 最大条目数
     MAX_WORKERS = int(os.getenv('MAX_WORKERS', '4'))
+    # 同一主机上的服务进程数（例如gunicorn的worker数，默认读取WEB_CONCURRENCY），用于均分推理线程
+    SERVER_WORKERS = int(os.getenv('SERVER_WORKERS', os.getenv('WEB_CONCURRENCY', '1')))
+    # 多进程推理池：超长文档的处理单元分发到MAX_WORKERS个持有模型的子进程
+    PROCESS_POOL_ENABLED = os.getenv('PROCESS_POOL_ENABLED', 'false').lower() == 'true'
+    PROCESS_POOL_MIN_ITEMS = int(os.getenv('PROCESS_POOL_MIN_ITEMS', '64'))  # 处理单元数不少于该值时才分发
     BATCH_MAX_LENGTH = int(os.getenv('BATCH_MAX_LENGTH', '128'))  # 批处理时单个文本最大长度
+    TOKENIZER_POOL_SIZE = int(os.getenv('TOKENIZER_POOL_SIZE', '4'))  # 可并发编码的快速分词器实例数
     WARMUP_ENABLED = os.getenv('WARMUP_ENABLED', 'true').lower() == 'true'  # 是否启用模型预热
+
+    # 长文本近似模式（提前结束）配置
+    APPROXIMATE_CI_THRESHOLD = float(os.getenv('APPROXIMATE_CI_THRESHOLD', '0.02'))  # 95%置信区间半宽低于该值时停止推理
+    APPROXIMATE_MIN_SAMPLES = int(os.getenv('APPROXIMATE_MIN_SAMPLES', '8'))  # 至少抽样的中间句子数
+    APPROXIMATE_MAX_SAMPLES = int(os.getenv('APPROXIMATE_MAX_SAMPLES', '0'))  # 最多抽样的中间句子数，0表示不限制
+
+    # 推理运行时配置
+    INFERENCE_MODE_ENABLED = os.getenv('INFERENCE_MODE_ENABLED', 'true').lower() == 'true'  # 使用torch.inference_mode()执行推理
+    INFERENCE_INTRA_OP_THREADS = int(os.getenv('INFERENCE_INTRA_OP_THREADS', '0'))  # 算子内线程数，0表示 可用CPU数/推理进程数
+    INFERENCE_INTER_OP_THREADS = int(os.getenv('INFERENCE_INTER_OP_THREADS', '1'))  # 算子间线程数
+    INFERENCE_CPU_AFFINITY = os.getenv('INFERENCE_CPU_AFFINITY', '')  # 可选的CPU亲和性，例如 "0-3"
+
+    # 动态批处理配置（合并并发的单文本请求）
+    DYNAMIC_BATCHING_ENABLED = os.getenv('DYNAMIC_BATCHING_ENABLED', 'true').lower() == 'true'
+    DYNAMIC_BATCH_MAX_SIZE = int(os.getenv('DYNAMIC_BATCH_MAX_SIZE', str(BATCH_SIZE)))  # 单个合并批次的最大文本数
+    DYNAMIC_BATCH_MAX_WAIT_MS = float(os.getenv('DYNAMIC_BATCH_MAX_WAIT_MS', '5'))  # 收集批次的最长等待时间(毫秒)，越大吞吐越高、延迟越大
     
     # 预热配置
     WARMUP_TEXTS = [
@@ -105,9 +160,36 @@ def validate_config():
     """验证配置的合理性"""
     assert config.MAX_TEXT_LENGTH > 0, "MAX_TEXT_LENGTH必须大于0"
     assert config.BATCH_SIZE > 0, "BATCH_SIZE必须大于0"
+    assert config.SEGMENT_BATCH_SIZE > 0, "SEGMENT_BATCH_SIZE必须大于0"
+    assert config.SEGMENT_CHUNK_OVERLAP >= 0, "SEGMENT_CHUNK_OVERLAP不能小于0"
     assert config.REQUEST_TIMEOUT > 0, "REQUEST_TIMEOUT必须大于0"
+    assert config.API_KEY_CACHE_TTL >= 0, "API_KEY_CACHE_TTL不能小于0"
+    assert config.API_KEY_CACHE_SIZE > 0, "API_KEY_CACHE_SIZE必须大于0"
+    assert config.LAST_USED_FLUSH_INTERVAL >= 0, "LAST_USED_FLUSH_INTERVAL不能小于0"
+    assert config.QUOTA_LEDGER_RECONCILE_INTERVAL > 0, "QUOTA_LEDGER_RECONCILE_INTERVAL必须大于0"
+    assert config.AUDIT_LOG_QUEUE_SIZE > 0, "AUDIT_LOG_QUEUE_SIZE必须大于0"
+    assert config.AUDIT_LOG_BATCH_SIZE > 0, "AUDIT_LOG_BATCH_SIZE必须大于0"
+    assert config.AUDIT_LOG_FLUSH_MS >= 0, "AUDIT_LOG_FLUSH_MS不能小于0"
+    assert config.AUDIT_LOG_PUT_TIMEOUT_MS >= 0, "AUDIT_LOG_PUT_TIMEOUT_MS不能小于0"
     assert config.LRU_CACHE_SIZE > 0, "LRU_CACHE_SIZE必须大于0"
+    assert config.SEGMENT_CACHE_SIZE > 0, "SEGMENT_CACHE_SIZE必须大于0"
+    assert config.SEGMENT_SENTENCE_CACHE_SIZE >= 0, "SEGMENT_SENTENCE_CACHE_SIZE不能小于0"
     assert config.BATCH_MAX_LENGTH > 0, "BATCH_MAX_LENGTH必须大于0"
+    assert config.TOKENIZER_POOL_SIZE > 0, "TOKENIZER_POOL_SIZE必须大于0"
+    assert config.INFERENCE_BACKEND in ('torch', 'onnx'), "INFERENCE_BACKEND必须为torch或onnx"
+    assert config.QUANTIZATION_MODE in ('none', 'dynamic_int8'), "QUANTIZATION_MODE必须为none或dynamic_int8"
+    assert config.INFERENCE_INTRA_OP_THREADS >= 0, "INFERENCE_INTRA_OP_THREADS不能小于0"
+    assert config.INFERENCE_INTER_OP_THREADS >= 0, "INFERENCE_INTER_OP_THREADS不能小于0"
+    assert config.SHARED_CACHE_TTL > 0, "SHARED_CACHE_TTL必须大于0"
+    assert config.SHARED_CACHE_MAX_ENTRIES > 0, "SHARED_CACHE_MAX_ENTRIES必须大于0"
+    assert config.DYNAMIC_BATCH_MAX_SIZE > 0, "DYNAMIC_BATCH_MAX_SIZE必须大于0"
+    assert config.DYNAMIC_BATCH_MAX_WAIT_MS >= 0, "DYNAMIC_BATCH_MAX_WAIT_MS不能小于0"
+    assert config.APPROXIMATE_CI_THRESHOLD > 0, "APPROXIMATE_CI_THRESHOLD必须大于0"
+    assert config.APPROXIMATE_MIN_SAMPLES >= 0, "APPROXIMATE_MIN_SAMPLES不能小于0"
+    assert config.APPROXIMATE_MAX_SAMPLES >= 0, "APPROXIMATE_MAX_SAMPLES不能小于0"
+    assert config.MAX_WORKERS > 0, "MAX_WORKERS必须大于0"
+    assert config.SERVER_WORKERS > 0, "SERVER_WORKERS必须大于0"
+    assert config.PROCESS_POOL_MIN_ITEMS > 0, "PROCESS_POOL_MIN_ITEMS必须大于0"
 
     # 创建缓存目录
     if not os.path.exists(config.MODEL_CACHE_DIR):
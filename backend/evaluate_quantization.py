@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+动态int8量化评估脚本
+在固定评估集上对比浮点模型和量化模型的分数漂移、推理耗时和模型大小
+
+用法:
+    python evaluate_quantization.py                 # 输出漂移报告
+    python evaluate_quantization.py --save PATH     # 同时保存预量化模型，供QUANTIZED_MODEL_PATH使用
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+
+# 在导入config之前强制使用浮点PyTorch模型，并关闭结果缓存，保证每次都真实推理
+os.environ['INFERENCE_BACKEND'] = 'torch'
+os.environ['QUANTIZATION_MODE'] = 'none'
+os.environ['RESULT_CACHE_ENABLED'] = 'false'
+os.environ['SHARED_CACHE_ENABLED'] = 'false'
+
+# 添加项目路径
+project_root = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, project_root)
+
+import torch
+from config import config
+from src.core.cemotion import Cemotion
+from src.core.quantization import EVALUATION_TEXTS, quantize_dynamic_int8, state_dict_size_mb, drift_report
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger('QuantizationEvaluator')
+
+
+def timed_predict(analyzer: Cemotion, texts, rounds: int = 3):
+    """多轮推理取平均耗时，返回(分数列表, 单条平均耗时毫秒)"""
+    scores = analyzer.predict_batch(texts)
+    start_time = time.time()
+    for _ in range(rounds):
+        analyzer.predict_batch(texts)
+    elapsed = (time.time() - start_time) / (rounds * len(texts))
+    return scores, round(elapsed * 1000, 3)
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='评估动态int8量化的分数漂移')
+    parser.add_argument('--save', help='保存预量化模型的路径')
+    parser.add_argument('--rounds', type=int, default=3, help='计时轮数')
+    args = parser.parse_args()
+
+    logger.info("加载浮点模型...")
+    analyzer = Cemotion(config=config)
+    fp32_size = state_dict_size_mb(analyzer.model)
+    fp32_scores, fp32_latency = timed_predict(analyzer, EVALUATION_TEXTS, args.rounds)
+
+    logger.info("执行动态int8量化...")
+    analyzer.model = quantize_dynamic_int8(analyzer.model)
+    analyzer.quantization = 'dynamic_int8'
+    int8_size = state_dict_size_mb(analyzer.model)
+    int8_scores, int8_latency = timed_predict(analyzer, EVALUATION_TEXTS, args.rounds)
+
+    report = drift_report(EVALUATION_TEXTS, fp32_scores, int8_scores)
+    report['fp32'] = {'size_mb': fp32_size, 'latency_ms_per_text': fp32_latency}
+    report['int8'] = {'size_mb': int8_size, 'latency_ms_per_text': int8_latency}
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    if args.save:
+        directory = os.path.dirname(os.path.abspath(args.save))
+        os.makedirs(directory, exist_ok=True)
+        torch.save(analyzer.model.state_dict(), args.save)
+        logger.info(f"预量化模型已保存: {args.save}")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+API调用记录的异步写入
+请求只把调用记录放入有界队列，后台线程批量插入api_calls表
+"""
+import time
+import queue
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from sqlalchemy import insert
+
+logger = logging.getLogger('SentiScore')
+
+
+class AuditLogWriter:
+    """
+    API调用记录写入队列
+
+    record() 把一条调用记录（字典）放入有界队列后立即返回；后台线程攒够batch_size条
+    或等待超过flush_ms毫秒后，用一条executemany形式的INSERT批量写入。
+    队列已满时最多等待put_timeout_ms毫秒（对请求形成背压），仍然放不进去的记录丢弃并计数。
+    进程退出时写入队列中剩余的记录。
+    """
+
+    def __init__(self, max_queue_size: int = 10000, batch_size: int = 200, flush_ms: float = 200,
+                 put_timeout_ms: float = 10):
+        """
+        初始化写入队列
+
+        Args:
+            max_queue_size: 队列容量
+            batch_size: 单次插入的最大记录数
+            flush_ms: 攒批的最长等待时间（毫秒）
+            put_timeout_ms: 队列已满时请求线程的最长等待时间（毫秒）
+        """
+        self.max_queue_size = max(1, int(max_queue_size))
+        self.batch_size = max(1, int(batch_size))
+        self.flush_ms = max(0.0, float(flush_ms))
+        self.put_timeout_ms = max(0.0, float(put_timeout_ms))
+
+        self._queue: queue.Queue = queue.Queue(maxsize=self.max_queue_size)
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._app = None
+
+        self._enqueued = 0
+        self._dropped = 0
+        self._written = 0
+        self._failed = 0
+        self._batches = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, app):
+        """启动后台写入线程（需要应用实例来创建应用上下文）"""
+        if self.running:
+            return
+        self._app = app
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='audit-log-writer', daemon=True)
+        self._thread.start()
+        logger.info(f"API调用记录异步写入已启动，队列容量: {self.max_queue_size}，"
+                    f"批大小: {self.batch_size}，攒批等待: {self.flush_ms}毫秒")
+
+    def record(self, **fields) -> bool:
+        """
+        记录一次API调用
+
+        字段与APICall模型一致，created_at默认为当前时间。后台线程未运行时直接写入数据库
+        （调用方需处于应用上下文中）。
+
+        Returns:
+            bool: 记录是否被接收（队列已满被丢弃时返回False）
+        """
+        fields.setdefault('created_at', datetime.now(timezone.utc))
+        if not self.running:
+            self._write([fields])
+            return True
+        try:
+            self._queue.put(fields, timeout=self.put_timeout_ms / 1000)
+        except queue.Full:
+            with self._lock:
+                self._dropped += 1
+                dropped = self._dropped
+            # 丢弃时按数量级记录日志，避免队列持续满载时刷屏
+            if dropped & (dropped - 1) == 0:
+                logger.warning(f"API调用记录队列已满，已丢弃{dropped}条记录")
+            return False
+        with self._lock:
+            self._enqueued += 1
+        return True
+
+    def _collect(self) -> List[dict]:
+        """从队列取出一批记录：等到第一条后，继续收集直到凑满或超过攒批等待时间"""
+        try:
+            first = self._queue.get(timeout=0.5)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.flush_ms / 1000
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        """后台线程主循环"""
+        while not self._stop_event.is_set():
+            batch = self._collect()
+            if batch:
+                self._flush_batch(batch)
+
+    def _flush_batch(self, batch: List[dict]):
+        """写入一批记录，失败时丢弃并计数"""
+        try:
+            with self._app.app_context():
+                self._write(batch)
+        except Exception as e:
+            with self._lock:
+                self._failed += len(batch)
+            logger.error(f"API调用记录批量写入失败，丢弃{len(batch)}条记录: {e}")
+            return
+        with self._lock:
+            self._written += len(batch)
+            self._batches += 1
+
+    @staticmethod
+    def _write(rows: List[dict]):
+        """批量插入"""
+        from src.database.manager import db
+        from src.models.api import APICall
+
+        try:
+            db.session.execute(insert(APICall.__table__), rows)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    def stop(self):
+        """停止后台线程并写入队列中剩余的记录"""
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._thread.join(timeout=5)
+        self._thread = None
+        remaining = []
+        while True:
+            try:
+                remaining.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        for start in range(0, len(remaining), self.batch_size):
+            self._flush_batch(remaining[start:start + self.batch_size])
+        if remaining:
+            logger.info(f"退出前写入API调用记录: {len(remaining)}条")
+
+    def stats(self) -> dict:
+        """获取写入队列统计"""
+        with self._lock:
+            return {
+                'running': self.running,
+                'queue_size': self._queue.qsize(),
+                'max_queue_size': self.max_queue_size,
+                'enqueued': self._enqueued,
+                'written': self._written,
+                'batches': self._batches,
+                'dropped': self._dropped,
+                'failed': self._failed
+            }
+
+
+def _create_writer() -> AuditLogWriter:
+    """根据配置创建全局写入队列"""
+    try:
+        from config import config
+        return AuditLogWriter(
+            max_queue_size=getattr(config, 'AUDIT_LOG_QUEUE_SIZE', 10000),
+            batch_size=getattr(config, 'AUDIT_LOG_BATCH_SIZE', 200),
+            flush_ms=getattr(config, 'AUDIT_LOG_FLUSH_MS', 200),
+            put_timeout_ms=getattr(config, 'AUDIT_LOG_PUT_TIMEOUT_MS', 10)
+        )
+    except ImportError:
+        return AuditLogWriter()
+
+
+# 进程内共享的API调用记录写入队列
+audit_log_writer = _create_writer()
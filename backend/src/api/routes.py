@@ -9,11 +9,14 @@ import gc
 import json
 from datetime import datetime
 from functools import wraps
-from flask import Blueprint, request, jsonify, current_app, Response
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context, g
 from flask_jwt_extended import get_jwt_identity, jwt_required
 from src.auth.decorators import api_key_required
 from src.auth.service import AuthService
-from src.models.api import APICall
+from src.auth.key_cache import api_key_cache
+from src.auth.last_used import last_used_recorder
+from src.auth.quota_ledger import quota_ledger
+from src.api.audit_log import audit_log_writer
 from src.models.user import APIKey  # 添加APIKey模型导入
 from src.utils.helpers import EmotionAnalysisError
 from src.api.auth_routes import auth_bp  # 添加认证路由导入
@@ -82,7 +85,36 @@ def api_response(data=None, code=200, message="请求成功", **kwargs):
         mimetype='application/json'
     )
 
-def register_routes(app, emotion_analyzer=None, text_segmentor=None):
+def ndjson_response(records, task_name: str = '流式处理'):
+    """
+    将记录生成器包装为NDJSON流式响应（每行一个JSON对象）
+
+    处理中途出错时输出一条type为error的记录后结束，已输出的记录仍然有效。
+
+    Args:
+        records: 产出dict的生成器
+        task_name: 任务名称，用于日志
+    """
+    def generate():
+        try:
+            for record in records:
+                yield json.dumps(record, ensure_ascii=False) + '\n'
+        except Exception as e:
+            logger.error(f"{task_name}流式输出中断: {e}", exc_info=True)
+            yield json.dumps({
+                'type': 'error',
+                'message': f"{task_name}失败: {str(e)}"
+            }, ensure_ascii=False) + '\n'
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/x-ndjson',
+        # 关闭反向代理缓冲，保证逐行推送
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+def register_routes(app, emotion_analyzer=None, text_segmentor=None, prediction_batcher=None,
+                    inference_pool=None):
     """注册所有API路由"""
     
     @app.route('/health')
@@ -100,7 +132,7 @@ def register_routes(app, emotion_analyzer=None, text_segmentor=None):
             except Exception as e:
                 db_status = f'error: {str(e)}'
             
-            return {
+            health = {
                 'status': 'healthy' if model_ready and db_status == 'healthy' else 'unhealthy',
                 'timestamp': int(time.time()),
                 'model_ready': model_ready,
@@ -108,6 +140,37 @@ def register_routes(app, emotion_analyzer=None, text_segmentor=None):
                 'gpu_available': False,  # 简化实现，实际项目中可以检查GPU状态
                 'version': '2.0.0'
             }
+            
+            # 推理运行时配置
+            if emotion_analyzer:
+                health['inference_runtime'] = emotion_analyzer.get_runtime_info()
+            
+            # 动态批处理队列状态
+            if prediction_batcher:
+                health['batcher'] = prediction_batcher.stats()
+            
+            # 多进程推理池状态
+            if inference_pool:
+                health['inference_pool'] = inference_pool.stats()
+            
+            # 结果缓存命中统计
+            if emotion_analyzer and emotion_analyzer.result_cache:
+                health['result_cache'] = emotion_analyzer.result_cache.stats()
+            if text_segmentor and text_segmentor.result_cache:
+                health['segment_cache'] = text_segmentor.result_cache.stats()
+            if text_segmentor and text_segmentor.sentence_cache:
+                health['segment_sentence_cache'] = text_segmentor.sentence_cache.stats()
+            if text_segmentor and text_segmentor.dict_engine:
+                health['segment_dict_engine'] = text_segmentor.dict_engine.stats()
+            
+            # API Key解析缓存命中统计
+            health['api_key_cache'] = api_key_cache.stats()
+            health['last_used_writer'] = last_used_recorder.stats()
+            if quota_ledger.enabled:
+                health['quota_ledger'] = quota_ledger.stats()
+            health['audit_log_writer'] = audit_log_writer.stats()
+            
+            return health
         except Exception as e:
             logger.error(f"健康检查失败: {e}")
             return {
@@ -116,6 +179,76 @@ def register_routes(app, emotion_analyzer=None, text_segmentor=None):
                 'error': str(e)
             }, 500
     
+    def resolve_segment_engine(user, requested):
+        """
+        确定分词引擎：请求参数优先，未指定时按用户套餐选择
+
+        Returns:
+            tuple: (引擎名称, 错误响应)
+        """
+        if requested is None and text_segmentor.dict_plans:
+            plan = AuthService().get_user_plan(user)
+            if plan and plan.plan_name in text_segmentor.dict_plans:
+                requested = 'dict'
+        try:
+            return text_segmentor.resolve_engine(requested), None
+        except ValueError as e:
+            return None, (api_response(code=400, message=str(e)), 400)
+    
+    def charge_quota(user, amount):
+        """
+        检查并扣减本次请求的配额
+
+        使用API密钥时只检查和扣减该密钥的配额，否则检查和扣减用户套餐配额。
+        检查和扣减由一条条件UPDATE（或启用时的配额账本）一次完成，配额不足以支付本次请求时返回403。
+
+        Args:
+            user: 当前用户
+            amount: 扣减数量
+
+        Returns:
+            tuple: (API密钥ID, 配额不足时的错误响应)
+        """
+        auth_service = AuthService()
+        
+        # 检查请求中是否包含API密钥
+        api_key_value = None
+        if 'X-API-Key' in request.headers:
+            api_key_value = request.headers.get('X-API-Key')
+        elif 'api_key' in request.args:
+            api_key_value = request.args.get('api_key')
+        elif 'api_key' in request.form:
+            api_key_value = request.form.get('api_key')
+        
+        key_exhausted = (api_response(
+            code=403,
+            message="API密钥配额已用完，请升级套餐或购买更多配额"
+        ), 403)
+        
+        # 如果使用了API密钥，则只检查和扣减API密钥的配额
+        if api_key_value:
+            resolved = getattr(g, 'api_key', None)
+            api_key_id = resolved.api_key_id if resolved else None
+            if api_key_id is None:
+                specific_api_key = APIKey.query.with_entities(APIKey.id).filter_by(
+                    key=api_key_value, user_id=user.id
+                ).first()
+                if not specific_api_key:
+                    return None, None
+                api_key_id = specific_api_key.id
+            if not auth_service.deduct_api_key_quota_by_id(api_key_id, amount):
+                return None, key_exhausted
+            return api_key_id, None
+        
+        # 如果没有使用API密钥，则检查并扣减用户套餐配额
+        if not auth_service.deduct_user_quota(user, amount):
+            _, quota_msg = auth_service.check_user_quota(user)
+            return None, (api_response(
+                code=403,
+                message=quota_msg or "配额不足以处理本次请求，请升级套餐"
+            ), 403)
+        return None, None
+    
     @api_bp.route('/analyze', methods=['POST'])
     @validate_json
     @api_key_required
@@ -147,7 +280,10 @@ def register_routes(app, emotion_analyzer=None, text_segmentor=None):
                     ), 400
             
             # 执行情感分析
-            if emotion_analyzer:
+            if emotion_analyzer and prediction_batcher:
+                # 通过动态批处理器与并发请求合并推理
+                emotion_score = prediction_batcher.predict(text)
+            elif emotion_analyzer:
                 # 使用新的predict方法
                 emotion_result = emotion_analyzer.predict(text)
                 if isinstance(emotion_result, list):
@@ -177,56 +313,24 @@ def register_routes(app, emotion_analyzer=None, text_segmentor=None):
             # 记录API调用（如果用户已认证）
             user_id = user.id
             if user_id:
-                auth_service = AuthService()
-                
-                # 检查请求中是否包含API密钥
-                api_key_value = None
-                specific_api_key = None
-                if 'X-API-Key' in request.headers:
-                    api_key_value = request.headers.get('X-API-Key')
-                elif 'api_key' in request.args:
-                    api_key_value = request.args.get('api_key')
-                elif 'api_key' in request.form:
-                    api_key_value = request.form.get('api_key')
-                
-                # 如果使用了API密钥，则只检查和扣减API密钥的配额
-                if api_key_value:
-                    specific_api_key = APIKey.query.filter_by(key=api_key_value, user_id=user.id).first()
-                    if specific_api_key:
-                        # 检查API密钥配额
-                        if specific_api_key.quota_used >= specific_api_key.quota_total:
-                            return api_response(
-                                code=403,
-                                message="API密钥配额已用完，请升级套餐或购买更多配额"
-                            ), 403
-                        # 扣减API密钥配额
-                        auth_service.deduct_api_key_quota(specific_api_key, 1)
-                else:
-                    # 如果没有使用API密钥，则检查并扣减用户套餐配额
-                    quota_valid, quota_msg = auth_service.check_user_quota(user)
-                    if not quota_valid:
-                        return api_response(
-                            code=403,
-                            message=quota_msg
-                        ), 403
-                    # 扣减用户套餐配额
-                    auth_service.deduct_user_quota(user, 1)
+                # 检查并扣减配额（使用API密钥时扣减密钥配额，否则扣减用户套餐配额）
+                api_key_id, error_response = charge_quota(user, 1)
+                if error_response:
+                    return error_response
                 
-                # 记录API调用
-                api_call = APICall()
-                api_call.user_id = user_id
-                api_call.api_key_id = specific_api_key.id if specific_api_key else None  # 添加API密钥ID
-                api_call.endpoint = '/analyze'
-                api_call.method = 'POST'
-                api_call.response_status = 200
-                api_call.response_time_ms = response_time
-                api_call.ip_address = request.remote_addr
-                api_call.user_agent = request.headers.get('User-Agent', '')
-                api_call.quota_deducted = True
-                api_call.batch_size = 1
-                from src.database.manager import db
-                db.session.add(api_call)
-                db.session.commit()
+                # 记录API调用（由后台线程批量写入）
+                audit_log_writer.record(
+                    user_id=user_id,
+                    api_key_id=api_key_id,
+                    endpoint='/analyze',
+                    method='POST',
+                    response_status=200,
+                    response_time_ms=response_time,
+                    ip_address=request.remote_addr,
+                    user_agent=request.headers.get('User-Agent', ''),
+                    quota_deducted=True,
+                    batch_size=1
+                )
             
             # 构造响应数据
             result = {
@@ -351,56 +455,24 @@ def register_routes(app, emotion_analyzer=None, text_segmentor=None):
             # 记录API调用（如果用户已认证）
             user_id = user.id
             if user_id:
-                auth_service = AuthService()
+                # 检查并扣减配额（使用API密钥时扣减密钥配额，否则扣减用户套餐配额）
+                api_key_id, error_response = charge_quota(user, len(texts))
+                if error_response:
+                    return error_response
                 
-                # 检查请求中是否包含API密钥
-                api_key_value = None
-                specific_api_key = None
-                if 'X-API-Key' in request.headers:
-                    api_key_value = request.headers.get('X-API-Key')
-                elif 'api_key' in request.args:
-                    api_key_value = request.args.get('api_key')
-                elif 'api_key' in request.form:
-                    api_key_value = request.form.get('api_key')
-                
-                # 如果使用了API密钥，则只检查和扣减API密钥的配额
-                if api_key_value:
-                    specific_api_key = APIKey.query.filter_by(key=api_key_value, user_id=user.id).first()
-                    if specific_api_key:
-                        # 检查API密钥配额
-                        if specific_api_key.quota_used >= specific_api_key.quota_total:
-                            return api_response(
-                                code=403,
-                                message="API密钥配额已用完，请升级套餐或购买更多配额"
-                            ), 403
-                        # 扣减API密钥配额（批量处理按文本数量扣减）
-                        auth_service.deduct_api_key_quota(specific_api_key, len(texts))
-                else:
-                    # 如果没有使用API密钥，则检查并扣减用户套餐配额
-                    quota_valid, quota_msg = auth_service.check_user_quota(user)
-                    if not quota_valid:
-                        return api_response(
-                            code=403,
-                            message=quota_msg
-                        ), 403
-                    # 扣减用户套餐配额（批量处理按文本数量扣减）
-                    auth_service.deduct_user_quota(user, len(texts))
-                
-                # 记录API调用
-                api_call = APICall()
-                api_call.user_id = user_id
-                api_call.api_key_id = specific_api_key.id if specific_api_key else None  # 添加API密钥ID
-                api_call.endpoint = '/batch'
-                api_call.method = 'POST'
-                api_call.response_status = 200
-                api_call.response_time_ms = response_time
-                api_call.ip_address = request.remote_addr
-                api_call.user_agent = request.headers.get('User-Agent', '')
-                api_call.quota_deducted = True
-                api_call.batch_size = len(texts)
-                from src.database.manager import db
-                db.session.add(api_call)
-                db.session.commit()
+                # 记录API调用（由后台线程批量写入）
+                audit_log_writer.record(
+                    user_id=user_id,
+                    api_key_id=api_key_id,
+                    endpoint='/batch',
+                    method='POST',
+                    response_status=200,
+                    response_time_ms=response_time,
+                    ip_address=request.remote_addr,
+                    user_agent=request.headers.get('User-Agent', ''),
+                    quota_deducted=True,
+                    batch_size=len(texts)
+                )
             
             # 构造响应数据
             result = {
@@ -467,9 +539,13 @@ def register_routes(app, emotion_analyzer=None, text_segmentor=None):
                     ), 400
             
             # 执行文本分词
+            engine = 'neural'
             if text_segmentor:
+                engine, error_response = resolve_segment_engine(user, data.get('engine'))
+                if error_response:
+                    return error_response
                 try:
-                    segments = text_segmentor.segment(text)
+                    segments = text_segmentor.segment(text, engine=engine)
                 except Exception as e:
                     logger.error(f"分词器执行出错: {e}", exc_info=True)
                     # 使用后备方案
@@ -484,62 +560,31 @@ def register_routes(app, emotion_analyzer=None, text_segmentor=None):
             # 记录API调用（如果用户已认证）
             user_id = user.id
             if user_id:
-                auth_service = AuthService()
-                
-                # 检查请求中是否包含API密钥
-                api_key_value = None
-                specific_api_key = None
-                if 'X-API-Key' in request.headers:
-                    api_key_value = request.headers.get('X-API-Key')
-                elif 'api_key' in request.args:
-                    api_key_value = request.args.get('api_key')
-                elif 'api_key' in request.form:
-                    api_key_value = request.form.get('api_key')
-                
-                # 如果使用了API密钥，则只检查和扣减API密钥的配额
-                if api_key_value:
-                    specific_api_key = APIKey.query.filter_by(key=api_key_value, user_id=user.id).first()
-                    if specific_api_key:
-                        # 检查API密钥配额
-                        if specific_api_key.quota_used >= specific_api_key.quota_total:
-                            return api_response(
-                                code=403,
-                                message="API密钥配额已用完，请升级套餐或购买更多配额"
-                            ), 403
-                        # 扣减API密钥配额
-                        auth_service.deduct_api_key_quota(specific_api_key, 1)
-                else:
-                    # 如果没有使用API密钥，则检查并扣减用户套餐配额
-                    quota_valid, quota_msg = auth_service.check_user_quota(user)
-                    if not quota_valid:
-                        return api_response(
-                            code=403,
-                            message=quota_msg
-                        ), 403
-                    # 扣减用户套餐配额
-                    auth_service.deduct_user_quota(user, 1)
+                # 检查并扣减配额（使用API密钥时扣减密钥配额，否则扣减用户套餐配额）
+                api_key_id, error_response = charge_quota(user, 1)
+                if error_response:
+                    return error_response
                 
-                # 记录API调用
-                api_call = APICall()
-                api_call.user_id = user_id
-                api_call.api_key_id = specific_api_key.id if specific_api_key else None
-                api_call.endpoint = '/segment'
-                api_call.method = 'POST'
-                api_call.response_status = 200
-                api_call.response_time_ms = response_time
-                api_call.ip_address = request.remote_addr
-                api_call.user_agent = request.headers.get('User-Agent', '')
-                api_call.quota_deducted = True
-                api_call.batch_size = 1
-                from src.database.manager import db
-                db.session.add(api_call)
-                db.session.commit()
+                # 记录API调用（由后台线程批量写入）
+                audit_log_writer.record(
+                    user_id=user_id,
+                    api_key_id=api_key_id,
+                    endpoint='/segment',
+                    method='POST',
+                    response_status=200,
+                    response_time_ms=response_time,
+                    ip_address=request.remote_addr,
+                    user_agent=request.headers.get('User-Agent', ''),
+                    quota_deducted=True,
+                    batch_size=1
+                )
             
             # 构造响应数据
             result = {
                 'segments': segments,
                 'segment_count': len(segments),
-                'text_length': len(text)
+                'text_length': len(text),
+                'engine': engine
             }
             
             logger.info(f"[{request.remote_addr}] 文本分词完成 - 文本长度: {len(text)}, 分词数量: {len(segments)}")
@@ -619,9 +664,13 @@ def register_routes(app, emotion_analyzer=None, text_segmentor=None):
             
             # 执行批量文本分词
             results = []
+            engine = 'neural'
             if text_segmentor:
-                for text in texts:
-                    segments = text_segmentor.segment(text)
+                engine, error_response = resolve_segment_engine(user, data.get('engine'))
+                if error_response:
+                    return error_response
+                # 整批送入分词器，由分词器按长度分桶批量处理
+                for text, segments in zip(texts, text_segmentor.segment_batch(texts, engine=engine)):
                     results.append({
                         'text': text,
                         'segments': segments,
@@ -643,61 +692,30 @@ def register_routes(app, emotion_analyzer=None, text_segmentor=None):
             # 记录API调用（如果用户已认证）
             user_id = user.id
             if user_id:
-                auth_service = AuthService()
-                
-                # 检查请求中是否包含API密钥
-                api_key_value = None
-                specific_api_key = None
-                if 'X-API-Key' in request.headers:
-                    api_key_value = request.headers.get('X-API-Key')
-                elif 'api_key' in request.args:
-                    api_key_value = request.args.get('api_key')
-                elif 'api_key' in request.form:
-                    api_key_value = request.form.get('api_key')
+                # 检查并扣减配额（使用API密钥时扣减密钥配额，否则扣减用户套餐配额）
+                api_key_id, error_response = charge_quota(user, len(texts))
+                if error_response:
+                    return error_response
                 
-                # 如果使用了API密钥，则只检查和扣减API密钥的配额
-                if api_key_value:
-                    specific_api_key = APIKey.query.filter_by(key=api_key_value, user_id=user.id).first()
-                    if specific_api_key:
-                        # 检查API密钥配额
-                        if specific_api_key.quota_used >= specific_api_key.quota_total:
-                            return api_response(
-                                code=403,
-                                message="API密钥配额已用完，请升级套餐或购买更多配额"
-                            ), 403
-                        # 扣减API密钥配额（批量处理按文本数量扣减）
-                        auth_service.deduct_api_key_quota(specific_api_key, len(texts))
-                else:
-                    # 如果没有使用API密钥，则检查并扣减用户套餐配额
-                    quota_valid, quota_msg = auth_service.check_user_quota(user)
-                    if not quota_valid:
-                        return api_response(
-                            code=403,
-                            message=quota_msg
-                        ), 403
-                    # 扣减用户套餐配额（批量处理按文本数量扣减）
-                    auth_service.deduct_user_quota(user, len(texts))
-                
-                # 记录API调用
-                api_call = APICall()
-                api_call.user_id = user_id
-                api_call.api_key_id = specific_api_key.id if specific_api_key else None
-                api_call.endpoint = '/segment/batch'
-                api_call.method = 'POST'
-                api_call.response_status = 200
-                api_call.response_time_ms = response_time
-                api_call.ip_address = request.remote_addr
-                api_call.user_agent = request.headers.get('User-Agent', '')
-                api_call.quota_deducted = True
-                api_call.batch_size = len(texts)
-                from src.database.manager import db
-                db.session.add(api_call)
-                db.session.commit()
+                # 记录API调用（由后台线程批量写入）
+                audit_log_writer.record(
+                    user_id=user_id,
+                    api_key_id=api_key_id,
+                    endpoint='/segment/batch',
+                    method='POST',
+                    response_status=200,
+                    response_time_ms=response_time,
+                    ip_address=request.remote_addr,
+                    user_agent=request.headers.get('User-Agent', ''),
+                    quota_deducted=True,
+                    batch_size=len(texts)
+                )
             
             # 构造响应数据
             result = {
                 'results': results,
-                'total_count': len(results)
+                'total_count': len(results),
+                'engine': engine
             }
             
             logger.info(f"[{request.remote_addr}] 批量文本分词完成 - 文本数量: {len(texts)}")
@@ -731,6 +749,7 @@ def register_routes(app, emotion_analyzer=None, text_segmentor=None):
             data = request.get_json()
             text = data.get('text', '')
             chunk_size = data.get('chunk_size', 512)  # 默认分块大小
+            overlap = data.get('overlap')  # 块边界两侧的上下文字符数，未指定时使用配置
             
             # 验证输入（不检查长度限制）
             if text_segmentor:
@@ -756,11 +775,13 @@ def register_routes(app, emotion_analyzer=None, text_segmentor=None):
             # 验证分块大小（限制在合理范围内）
             if not isinstance(chunk_size, int) or chunk_size < 100 or chunk_size > 1024:
                 chunk_size = 512  # 使用默认值
+            if overlap is not None and (not isinstance(overlap, int) or overlap < 0 or overlap > 64):
+                overlap = None  # 使用配置的默认值
             
             # 执行长文本分词
             if text_segmentor:
                 try:
-                    segments = text_segmentor.segment_long_text(text, chunk_size)
+                    segments = text_segmentor.segment_long_text(text, chunk_size, overlap=overlap)
                 except Exception as e:
                     logger.error(f"长文本分词器执行出错: {e}", exc_info=True)
                     # 使用后备方案
@@ -775,56 +796,24 @@ def register_routes(app, emotion_analyzer=None, text_segmentor=None):
             # 记录API调用（如果用户已认证）
             user_id = user.id
             if user_id:
-                auth_service = AuthService()
+                # 检查并扣减配额（使用API密钥时扣减密钥配额，否则扣减用户套餐配额）
+                api_key_id, error_response = charge_quota(user, 1)
+                if error_response:
+                    return error_response
                 
-                # 检查请求中是否包含API密钥
-                api_key_value = None
-                specific_api_key = None
-                if 'X-API-Key' in request.headers:
-                    api_key_value = request.headers.get('X-API-Key')
-                elif 'api_key' in request.args:
-                    api_key_value = request.args.get('api_key')
-                elif 'api_key' in request.form:
-                    api_key_value = request.form.get('api_key')
-                
-                # 如果使用了API密钥，则只检查和扣减API密钥的配额
-                if api_key_value:
-                    specific_api_key = APIKey.query.filter_by(key=api_key_value, user_id=user.id).first()
-                    if specific_api_key:
-                        # 检查API密钥配额
-                        if specific_api_key.quota_used >= specific_api_key.quota_total:
-                            return api_response(
-                                code=403,
-                                message="API密钥配额已用完，请升级套餐或购买更多配额"
-                            ), 403
-                        # 扣减API密钥配额
-                        auth_service.deduct_api_key_quota(specific_api_key, 1)
-                else:
-                    # 如果没有使用API密钥，则检查并扣减用户套餐配额
-                    quota_valid, quota_msg = auth_service.check_user_quota(user)
-                    if not quota_valid:
-                        return api_response(
-                            code=403,
-                            message=quota_msg
-                        ), 403
-                    # 扣减用户套餐配额
-                    auth_service.deduct_user_quota(user, 1)
-                
-                # 记录API调用
-                api_call = APICall()
-                api_call.user_id = user_id
-                api_call.api_key_id = specific_api_key.id if specific_api_key else None
-                api_call.endpoint = '/segment/long'
-                api_call.method = 'POST'
-                api_call.response_status = 200
-                api_call.response_time_ms = response_time
-                api_call.ip_address = request.remote_addr
-                api_call.user_agent = request.headers.get('User-Agent', '')
-                api_call.quota_deducted = True
-                api_call.batch_size = 1
-                from src.database.manager import db
-                db.session.add(api_call)
-                db.session.commit()
+                # 记录API调用（由后台线程批量写入）
+                audit_log_writer.record(
+                    user_id=user_id,
+                    api_key_id=api_key_id,
+                    endpoint='/segment/long',
+                    method='POST',
+                    response_status=200,
+                    response_time_ms=response_time,
+                    ip_address=request.remote_addr,
+                    user_agent=request.headers.get('User-Agent', ''),
+                    quota_deducted=True,
+                    batch_size=1
+                )
             
             # 构造响应数据
             result = {
@@ -865,6 +854,8 @@ def register_routes(app, emotion_analyzer=None, text_segmentor=None):
             data = request.get_json()
             text = data.get('text', '')
             chunk_size = data.get('chunk_size', 512)  # 默认分块大小
+            packing = bool(data.get('packing', False))  # 是否打包相邻短句后再推理
+            approximate = bool(data.get('approximate', False))  # 是否启用提前结束的近似模式
             
             # 验证输入（不检查长度限制）
             if emotion_analyzer:
@@ -894,7 +885,9 @@ def register_routes(app, emotion_analyzer=None, text_segmentor=None):
             # 执行长文本情感分析
             if emotion_analyzer:
                 try:
-                    emotion_result = emotion_analyzer.analyze_long_text_emotion(text, chunk_size)
+                    emotion_result = emotion_analyzer.analyze_long_text_emotion(
+                        text, chunk_size, packing=packing, approximate=approximate
+                    )
                 except EmotionAnalysisError as e:
                     logger.error(f"长文本情感分析错误: {e}")
                     return api_response(
@@ -923,56 +916,24 @@ def register_routes(app, emotion_analyzer=None, text_segmentor=None):
             # 记录API调用（如果用户已认证）
             user_id = user.id
             if user_id:
-                auth_service = AuthService()
-                
-                # 检查请求中是否包含API密钥
-                api_key_value = None
-                specific_api_key = None
-                if 'X-API-Key' in request.headers:
-                    api_key_value = request.headers.get('X-API-Key')
-                elif 'api_key' in request.args:
-                    api_key_value = request.args.get('api_key')
-                elif 'api_key' in request.form:
-                    api_key_value = request.form.get('api_key')
-                
-                # 如果使用了API密钥，则只检查和扣减API密钥的配额
-                if api_key_value:
-                    specific_api_key = APIKey.query.filter_by(key=api_key_value, user_id=user.id).first()
-                    if specific_api_key:
-                        # 检查API密钥配额
-                        if specific_api_key.quota_used >= specific_api_key.quota_total:
-                            return api_response(
-                                code=403,
-                                message="API密钥配额已用完，请升级套餐或购买更多配额"
-                            ), 403
-                        # 扣减API密钥配额
-                        auth_service.deduct_api_key_quota(specific_api_key, 1)
-                else:
-                    # 如果没有使用API密钥，则检查并扣减用户套餐配额
-                    quota_valid, quota_msg = auth_service.check_user_quota(user)
-                    if not quota_valid:
-                        return api_response(
-                            code=403,
-                            message=quota_msg
-                        ), 403
-                    # 扣减用户套餐配额
-                    auth_service.deduct_user_quota(user, 1)
+                # 检查并扣减配额（使用API密钥时扣减密钥配额，否则扣减用户套餐配额）
+                api_key_id, error_response = charge_quota(user, 1)
+                if error_response:
+                    return error_response
                 
-                # 记录API调用
-                api_call = APICall()
-                api_call.user_id = user_id
-                api_call.api_key_id = specific_api_key.id if specific_api_key else None
-                api_call.endpoint = '/analyze/long'
-                api_call.method = 'POST'
-                api_call.response_status = 200
-                api_call.response_time_ms = response_time
-                api_call.ip_address = request.remote_addr
-                api_call.user_agent = request.headers.get('User-Agent', '')
-                api_call.quota_deducted = True
-                api_call.batch_size = 1
-                from src.database.manager import db
-                db.session.add(api_call)
-                db.session.commit()
+                # 记录API调用（由后台线程批量写入）
+                audit_log_writer.record(
+                    user_id=user_id,
+                    api_key_id=api_key_id,
+                    endpoint='/analyze/long',
+                    method='POST',
+                    response_status=200,
+                    response_time_ms=response_time,
+                    ip_address=request.remote_addr,
+                    user_agent=request.headers.get('User-Agent', ''),
+                    quota_deducted=True,
+                    batch_size=1
+                )
             
             # 构造响应数据
             result = {
@@ -980,7 +941,11 @@ def register_routes(app, emotion_analyzer=None, text_segmentor=None):
                 'emotion': emotion_result.emotion,
                 'confidence': round(emotion_result.confidence, 4),
                 'text_length': emotion_result.text_length,
-                'chunk_size': chunk_size
+                'chunk_size': chunk_size,
+                'packing': packing,
+                'approximate': approximate,
+                'sentences_scored': getattr(emotion_result, 'timings', {}).get('sentences_scored'),
+                'timings': getattr(emotion_result, 'timings', {})
             }
             
             logger.info(f"[{request.remote_addr}] 长文本情感分析完成 - 文本长度: {len(text)}, 情感分数: {emotion_result.emotion_score}")
@@ -1005,6 +970,135 @@ def register_routes(app, emotion_analyzer=None, text_segmentor=None):
                 if collected > 0:
                     logger.debug(f"垃圾回收完成，清理对象数: {collected}")
 
+    def charge_stream_request(user, endpoint, start_time):
+        """
+        流式接口在开始输出前完成配额检查、扣减和调用记录
+
+        流式响应一旦开始就无法再返回403，因此配额处理必须在产出第一条记录之前完成。
+
+        Returns:
+            配额不足时返回错误响应，否则返回None
+        """
+        if not user.id:
+            return None
+        # 检查并扣减配额（使用API密钥时扣减密钥配额，否则扣减用户套餐配额）
+        api_key_id, error_response = charge_quota(user, 1)
+        if error_response:
+            return error_response
+        
+        # 记录API调用（响应时间为开始输出前的耗时，由后台线程批量写入）
+        audit_log_writer.record(
+            user_id=user.id,
+            api_key_id=api_key_id,
+            endpoint=endpoint,
+            method='POST',
+            response_status=200,
+            response_time_ms=round((time.time() - start_time) * 1000, 2),
+            ip_address=request.remote_addr,
+            user_agent=request.headers.get('User-Agent', ''),
+            quota_deducted=True,
+            batch_size=1
+        )
+        return None
+
+    @api_bp.route('/analyze/long/stream', methods=['POST'])
+    @validate_json
+    @api_key_required
+    def analyze_long_text_emotion_stream(user):
+        """
+        流式长文本情感分析接口
+
+        以NDJSON格式逐行输出：每个处理单元完成后输出一条chunk记录（含当前加权聚合分数），
+        最后输出一条summary记录。
+        """
+        start_time = time.time()
+        data = request.get_json()
+        text = data.get('text', '')
+        chunk_size = data.get('chunk_size', 512)
+        packing = bool(data.get('packing', False))
+        
+        if not emotion_analyzer:
+            return api_response(
+                code=503,
+                message="情感分析服务未就绪"
+            ), 503
+        
+        is_valid, error_msg = emotion_analyzer.validate_input(text)
+        if not is_valid:
+            return api_response(
+                code=400,
+                message=error_msg.message if hasattr(error_msg, 'message') else str(error_msg)
+            ), 400
+        
+        if not isinstance(chunk_size, int) or chunk_size < 100 or chunk_size > 1024:
+            chunk_size = 512
+        
+        error_response = charge_stream_request(user, '/analyze/long/stream', start_time)
+        if error_response:
+            return error_response
+        
+        records = emotion_analyzer.iter_long_text_emotion(text, chunk_size, packing=packing)
+        logger.info(f"[{request.remote_addr}] 开始流式长文本情感分析 - 文本长度: {len(text)}")
+        return ndjson_response(records, '长文本情感分析')
+
+    @api_bp.route('/segment/long/stream', methods=['POST'])
+    @validate_json
+    @api_key_required
+    def segment_long_text_stream(user):
+        """
+        流式长文本分词接口
+
+        以NDJSON格式逐行输出：每个文本块分词完成后输出一条chunk记录，最后输出一条summary记录。
+        """
+        start_time = time.time()
+        data = request.get_json()
+        text = data.get('text', '')
+        chunk_size = data.get('chunk_size', 512)
+        
+        if not text_segmentor:
+            return api_response(
+                code=503,
+                message="分词服务未就绪"
+            ), 503
+        
+        is_valid, error_msg = text_segmentor.validate_input_without_length_check(text)
+        if not is_valid:
+            return api_response(
+                code=400,
+                message=error_msg.message if hasattr(error_msg, 'message') else str(error_msg)
+            ), 400
+        
+        if not isinstance(chunk_size, int) or chunk_size < 100 or chunk_size > 1024:
+            chunk_size = 512
+        
+        error_response = charge_stream_request(user, '/segment/long/stream', start_time)
+        if error_response:
+            return error_response
+        
+        def generate_records():
+            segment_count = 0
+            chunk_count = 0
+            for index, chunk, segments in text_segmentor.iter_long_text_segments(text, chunk_size):
+                segment_count += len(segments)
+                chunk_count += 1
+                yield {
+                    'type': 'chunk',
+                    'index': index,
+                    'text_length': len(chunk),
+                    'segments': segments
+                }
+            yield {
+                'type': 'summary',
+                'segment_count': segment_count,
+                'chunk_count': chunk_count,
+                'text_length': len(text),
+                'chunk_size': chunk_size,
+                'total_ms': round((time.time() - start_time) * 1000, 2)
+            }
+        
+        logger.info(f"[{request.remote_addr}] 开始流式长文本分词 - 文本长度: {len(text)}")
+        return ndjson_response(generate_records(), '长文本分词')
+
     # 注册蓝图
     app.register_blueprint(api_bp)
     app.register_blueprint(auth_bp)  # 确保认证路由正确注册
@@ -3,9 +3,11 @@
 鉴权装饰器
 """
 from functools import wraps
-from flask import jsonify, request, current_app
+from flask import jsonify, request, current_app, g
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from src.auth.service import AuthService
+from src.auth.key_cache import CachedUser
+from src.auth.last_used import last_used_recorder
 from src.models.user import User, Admin
 from src.utils.helpers import create_error_response
 
@@ -79,20 +81,17 @@ def api_key_required(f):
         if not api_key:
             return create_error_response("API_KEY_REQUIRED", "缺少API Key", 401)
         
-        # 验证API Key
-        user = auth_service.verify_api_key(api_key)
-        if not user:
+        # 验证API Key（解析结果缓存在进程内，命中时不查询数据库）
+        resolved = auth_service.resolve_api_key(api_key)
+        if not resolved:
             return create_error_response("INVALID_API_KEY", "无效的API Key", 401)
+        g.api_key = resolved
         
-        # 如果使用的是API密钥表中的密钥，则更新最后使用时间
-        from src.models.user import APIKey
-        api_key_record = APIKey.query.filter_by(key=api_key, is_active=True).first()
-        if api_key_record:
-            from datetime import datetime, timezone
-            api_key_record.last_used_at = datetime.now(timezone.utc)
-            from src.database.manager import db
-            db.session.commit()
+        # 如果使用的是API密钥表中的密钥，则记录最后使用时间（由后台线程定期批量写入）
+        if resolved.api_key_id is not None:
+            last_used_recorder.record(resolved.api_key_id)
         
+        user = CachedUser(resolved.user_id, resolved.user_status)
         return f(user=user, *args, **kwargs)
     
     return decorated_function
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+API Key解析缓存
+把API Key的验证结果保存在进程内，稳定状态下鉴权不再查询数据库
+"""
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+logger = logging.getLogger('SentiScore')
+
+
+def hash_api_key(api_key: str) -> str:
+    """计算API Key的SHA-256摘要（缓存中不保存明文密钥）"""
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()
+
+
+@dataclass(frozen=True)
+class ResolvedAPIKey:
+    """API Key的解析结果"""
+    user_id: int
+    user_status: str
+    # api_keys表中对应的记录，仅使用users表主密钥且没有对应记录时为None
+    api_key_id: Optional[int] = None
+    quota_total: Optional[int] = None
+
+
+class CachedUser:
+    """
+    由缓存构造的轻量用户对象
+
+    路由只需要用户ID，因此命中缓存时不加载User；访问其他属性时才从数据库加载完整的用户记录。
+    """
+
+    def __init__(self, user_id: int, status: str):
+        self.id = user_id
+        self.status = status
+        self._user = None
+
+    def __getattr__(self, name):
+        if self._user is None:
+            from src.models.user import User
+            self._user = User.query.get(self.id)
+            if self._user is None:
+                raise AttributeError(name)
+        return getattr(self._user, name)
+
+    def __repr__(self):
+        return f'<CachedUser {self.id}>'
+
+
+class APIKeyCache:
+    """
+    带过期时间的API Key解析缓存
+
+    键为API Key的摘要，值为 ResolvedAPIKey。通过AuthService轮换、停用或删除密钥时立即失效；
+    多worker部署时其他进程的缓存最多在ttl_seconds后失效。无效的API Key不缓存，
+    新创建的密钥可以立即使用。
+    """
+
+    def __init__(self, ttl_seconds: float = 60, max_size: int = 10000):
+        """
+        初始化缓存
+
+        Args:
+            ttl_seconds: 条目有效期（秒），0表示不缓存
+            max_size: 最大条目数，超出后淘汰最早写入的条目
+        """
+        self.ttl_seconds = max(0.0, float(ttl_seconds))
+        self.max_size = max(1, int(max_size))
+
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0
+
+    def get(self, api_key: str) -> Optional[ResolvedAPIKey]:
+        """查询未过期的解析结果，不存在时返回None"""
+        if not self.enabled:
+            return None
+        key = hash_api_key(api_key)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > now:
+                self._hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._data[key]
+            self._misses += 1
+        return None
+
+    def set(self, api_key: str, resolved: ResolvedAPIKey):
+        """写入解析结果"""
+        if not self.enabled:
+            return
+        key = hash_api_key(api_key)
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (time.monotonic() + self.ttl_seconds, resolved)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def invalidate(self, *api_keys: Optional[str]):
+        """使指定API Key的解析结果失效"""
+        with self._lock:
+            for api_key in api_keys:
+                if api_key and self._data.pop(hash_api_key(api_key), None) is not None:
+                    self._invalidations += 1
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        """获取命中率统计"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'size': len(self._data),
+                'max_size': self.max_size,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self._hits,
+                'misses': self._misses,
+                'invalidations': self._invalidations,
+                'hit_rate': round(self._hits / lookups, 4) if lookups else 0.0
+            }
+
+
+def _create_cache() -> APIKeyCache:
+    """根据配置创建全局缓存"""
+    try:
+        from config import config
+        return APIKeyCache(
+            ttl_seconds=getattr(config, 'API_KEY_CACHE_TTL', 60),
+            max_size=getattr(config, 'API_KEY_CACHE_SIZE', 10000)
+        )
+    except ImportError:
+        return APIKeyCache()
+
+
+# 进程内共享的API Key解析缓存
+api_key_cache = _create_cache()
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+API密钥最后使用时间的延迟写入
+请求只在内存中记录时间，后台线程定期用一条批量UPDATE写入数据库
+"""
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from sqlalchemy import case, update
+
+logger = logging.getLogger('SentiScore')
+
+
+class LastUsedRecorder:
+    """
+    last_used_at写缓冲
+
+    record() 把 API密钥ID -> 最后使用时间 记录在内存中（同一密钥只保留最新时间）；
+    后台线程每隔flush_interval秒取出全部记录，执行一条
+    UPDATE api_keys SET last_used_at = CASE id WHEN ... END WHERE id IN (...)。
+    进程退出时再写入一次。数据库中的last_used_at最多落后flush_interval秒。
+    """
+
+    def __init__(self, flush_interval: float = 5.0):
+        """
+        初始化写缓冲
+
+        Args:
+            flush_interval: 写入间隔（秒），0表示不缓冲，每次请求直接写入
+        """
+        self.flush_interval = max(0.0, float(flush_interval))
+
+        self._pending: Dict[int, datetime] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._app = None
+
+        self._recorded = 0
+        self._flushes = 0
+        self._flushed_rows = 0
+        self._failed_flushes = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, app):
+        """启动后台写入线程（需要应用实例来创建应用上下文）"""
+        if self.flush_interval <= 0 or self.running:
+            return
+        self._app = app
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='last-used-writer', daemon=True)
+        self._thread.start()
+        logger.info(f"API密钥最后使用时间延迟写入已启动，写入间隔: {self.flush_interval}秒")
+
+    def record(self, api_key_id: int, used_at: Optional[datetime] = None):
+        """
+        记录一次使用
+
+        后台线程未运行时直接写入数据库（调用方需处于应用上下文中）。
+        """
+        used_at = used_at or datetime.now(timezone.utc)
+        if not self.running:
+            self._write({api_key_id: used_at})
+            return
+        with self._lock:
+            previous = self._pending.get(api_key_id)
+            if previous is None or used_at > previous:
+                self._pending[api_key_id] = used_at
+            self._recorded += 1
+
+    def pending(self, api_key_id: int) -> Optional[datetime]:
+        """获取尚未写入数据库的最后使用时间"""
+        with self._lock:
+            return self._pending.get(api_key_id)
+
+    def _run(self):
+        """后台线程主循环"""
+        while not self._stop_event.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self) -> int:
+        """
+        把缓冲的记录写入数据库
+
+        Returns:
+            int: 写入的密钥数
+        """
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                batch, self._pending = self._pending, {}
+
+            try:
+                if self._app is not None:
+                    with self._app.app_context():
+                        self._write(batch)
+                else:
+                    self._write(batch)
+            except Exception as e:
+                logger.error(f"API密钥最后使用时间写入失败，下次重试: {e}")
+                # 写入失败时放回缓冲区，保留较新的时间
+                with self._lock:
+                    for api_key_id, used_at in batch.items():
+                        current = self._pending.get(api_key_id)
+                        if current is None or used_at > current:
+                            self._pending[api_key_id] = used_at
+                    self._failed_flushes += 1
+                return 0
+
+            with self._lock:
+                self._flushes += 1
+                self._flushed_rows += len(batch)
+            return len(batch)
+
+    @staticmethod
+    def _write(batch: Dict[int, datetime]):
+        """执行一条批量UPDATE"""
+        from src.database.manager import db
+        from src.models.user import APIKey
+
+        table = APIKey.__table__
+        try:
+            db.session.execute(
+                update(table)
+                .where(table.c.id.in_(list(batch)))
+                .values(last_used_at=case(batch, value=table.c.id))
+            )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    def stop(self):
+        """停止后台线程并写入剩余记录"""
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join(timeout=self.flush_interval + 5)
+            self._thread = None
+        self.flush()
+
+    def stats(self) -> dict:
+        """获取写缓冲统计"""
+        with self._lock:
+            return {
+                'flush_interval': self.flush_interval,
+                'running': self.running,
+                'pending': len(self._pending),
+                'recorded': self._recorded,
+                'flushes': self._flushes,
+                'flushed_rows': self._flushed_rows,
+                'failed_flushes': self._failed_flushes
+            }
+
+
+def _create_recorder() -> LastUsedRecorder:
+    """根据配置创建全局写缓冲"""
+    try:
+        from config import config
+        return LastUsedRecorder(flush_interval=getattr(config, 'LAST_USED_FLUSH_INTERVAL', 5))
+    except ImportError:
+        return LastUsedRecorder()
+
+
+# 进程内共享的最后使用时间写缓冲
+last_used_recorder = _create_recorder()
@@ -0,0 +1,519 @@
+# -*- coding: utf-8 -*-
+"""
+配额账本
+在内存中检查和扣减配额，每次扣减先追加到日志文件，再定期批量同步到数据库
+"""
+import os
+import glob
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import case, select, update
+from sqlalchemy.exc import IntegrityError
+
+logger = logging.getLogger('SentiScore')
+
+# 账本类型：api_key对应api_keys表，plan对应user_plans表
+KINDS = ('api_key', 'plan')
+# 日志记录中的类型标记
+KIND_CODES = {'api_key': 'k', 'plan': 'p'}
+CODE_KINDS = {code: kind for kind, code in KIND_CODES.items()}
+# 数据库中已应用的日志段标记（system_config表）
+MARKER_PREFIX = 'quota_ledger_segment:'
+# 单条IN查询的最大ID数
+QUERY_CHUNK_SIZE = 500
+
+
+def _table(kind: str):
+    """获取账本类型对应的数据表"""
+    from src.models.user import APIKey, UserPlan
+    return APIKey.__table__ if kind == 'api_key' else UserPlan.__table__
+
+
+def _pid_alive(pid: int) -> bool:
+    """检查进程是否仍在运行"""
+    if pid == os.getpid():
+        # 本进程启动前留下的日志段（容器重启后PID可能相同）
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+    return True
+
+
+class QuotaLedger:
+    """
+    进程内配额账本
+
+    每个API密钥/套餐在首次使用时从数据库读取 quota_total 和 quota_used，
+    之后的检查和扣减都在内存中完成（加锁，O(1)），不会出现并发请求读到同一个旧值导致的漏计。
+
+    每次扣减在返回前追加一行到当前日志段。日志段无缓冲写入，进程崩溃不会丢失；但只在切换日志段
+    和退出时fsync，主机宕机或断电会丢失最近一个同步周期内尚未同步到数据库的扣减。后台线程每隔
+    reconcile_interval秒切换到新的日志段（旧日志段fsync后关闭），把累计的增量用一条 UPDATE ... CASE
+    写入每张表，并在同一个事务中写入已应用日志段的标记，提交后再删除日志段文件。启动时重放其他
+    已退出进程（或本进程上次运行）留下的日志段：先通过重命名认领，多个worker同时启动时每个日志段
+    只由一个worker重放；已有标记的日志段直接删除，保证增量只应用一次。
+
+    同步后重新读取数据库中的配额，管理员调整的总配额和其他worker进程的用量随之生效；
+    多个worker进程之间最多相差一个同步周期的用量。用户ID到当前有效套餐ID的映射同样缓存在账本中，
+    按用户扣减套餐配额时不查询数据库；映射在每次同步时重新读取，也可以通过invalidate_plan立即失效。
+    """
+
+    def __init__(self, journal_dir: str, reconcile_interval: float = 2.0, enabled: bool = False):
+        """
+        初始化配额账本
+
+        Args:
+            journal_dir: 日志段目录
+            reconcile_interval: 同步到数据库的间隔（秒）
+            enabled: 是否启用
+        """
+        self.journal_dir = os.path.abspath(journal_dir)
+        self.reconcile_interval = max(0.1, float(reconcile_interval))
+        self.enabled = enabled
+
+        # (类型, ID) -> [总配额, 数据库中的已用配额, 同步中的增量, 未同步的增量]
+        self._entries: Dict[Tuple[str, int], List[int]] = {}
+        # 用户ID -> 当前有效套餐ID（没有有效套餐的用户不缓存）
+        self._plans: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._reconcile_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._app = None
+
+        self._journal = None
+        self._segment_path: Optional[str] = None
+        # 已写入日志但尚未应用到数据库的日志段
+        self._unapplied_segments: List[str] = []
+
+        self._deductions = 0
+        self._rejections = 0
+        self._reconciles = 0
+        self._failed_reconciles = 0
+        self._replayed_segments = 0
+
+    @property
+    def running(self) -> bool:
+        """账本是否已启动（未启动时按数据库直接扣减）"""
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, app):
+        """重放遗留日志段，打开新的日志段并启动同步线程"""
+        if not self.enabled or self._thread is not None:
+            return
+        self._app = app
+        os.makedirs(self.journal_dir, exist_ok=True)
+        with app.app_context():
+            self.replay()
+        self._close_segment(self._open_segment())
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='quota-ledger', daemon=True)
+        self._thread.start()
+        logger.info(f"配额账本已启用，日志目录: {self.journal_dir}，同步间隔: {self.reconcile_interval}秒")
+
+    def _open_segment(self):
+        """
+        打开新的日志段（调用方持有锁或尚未启动线程）
+
+        Returns:
+            旧日志段的文件对象（没有时为None），由调用方在锁外调用_close_segment
+        """
+        previous = self._journal
+        self._segment_path = os.path.join(
+            self.journal_dir, f"ledger-{os.getpid()}-{time.time_ns()}.log"
+        )
+        self._journal = open(self._segment_path, 'ab', buffering=0)
+        return previous
+
+    @staticmethod
+    def _close_segment(journal):
+        """把日志段刷到磁盘后关闭（组提交边界）"""
+        if journal is None:
+            return
+        try:
+            os.fsync(journal.fileno())
+        except OSError as e:
+            logger.warning(f"配额日志段fsync失败: {e}")
+        journal.close()
+
+    def _load(self, kind: str, row_id: int) -> Optional[Tuple[int, int]]:
+        """从数据库读取总配额和已用配额（调用方需处于应用上下文中）"""
+        from src.database.manager import db
+        table = _table(kind)
+        row = db.session.execute(
+            select(table.c.quota_total, table.c.quota_used).where(table.c.id == row_id)
+        ).first()
+        if row is None:
+            return None
+        return int(row[0] or 0), int(row[1] or 0)
+
+    def deduct(self, kind: str, row_id: int, amount: int = 1,
+               seed: Optional[Tuple[int, int]] = None) -> bool:
+        """
+        扣减配额
+
+        Args:
+            kind: 账本类型（api_key或plan）
+            row_id: 记录ID
+            amount: 扣减数量
+            seed: 调用方已加载的 (总配额, 已用配额)，账本中没有该记录时用于初始化，避免再查询数据库
+
+        Returns:
+            bool: 配额充足并已扣减时返回True
+        """
+        key = (kind, row_id)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            loaded = seed if seed is not None else self._load(kind, row_id)
+            if loaded is None:
+                return False
+            with self._lock:
+                entry = self._entries.setdefault(key, [loaded[0], loaded[1], 0, 0])
+
+        with self._lock:
+            quota_total, quota_used, in_flight, pending = entry
+            if quota_used + in_flight + pending + amount > quota_total:
+                self._rejections += 1
+                return False
+            if self._journal is not None:
+                self._journal.write(f"{KIND_CODES[kind]} {row_id} {amount}\n".encode('ascii'))
+            entry[3] += amount
+            self._deductions += 1
+        return True
+
+    def active_plan(self, user_id: int) -> Optional[int]:
+        """
+        获取用户当前有效套餐的ID（调用方需处于应用上下文中）
+
+        首次查询时从数据库读取，同时用读到的配额初始化账本记录；没有有效套餐时返回None。
+        """
+        with self._lock:
+            plan_id = self._plans.get(user_id)
+        if plan_id is not None:
+            return plan_id
+
+        from src.database.manager import db
+        table = _table('plan')
+        row = db.session.execute(
+            select(table.c.id, table.c.quota_total, table.c.quota_used)
+            .where(table.c.user_id == user_id, table.c.is_active.is_(True))
+            .limit(1)
+        ).first()
+        if row is None:
+            return None
+        plan_id = int(row[0])
+        with self._lock:
+            self._plans[user_id] = plan_id
+            self._entries.setdefault(('plan', plan_id), [int(row[1] or 0), int(row[2] or 0), 0, 0])
+        return plan_id
+
+    def invalidate_plan(self, user_id: int):
+        """使用户的套餐映射失效（用户更换或停用套餐后调用）"""
+        with self._lock:
+            self._plans.pop(user_id, None)
+
+    def remaining(self, kind: str, row_id: int) -> Optional[int]:
+        """获取账本中的剩余配额，账本中没有该记录时返回None"""
+        with self._lock:
+            entry = self._entries.get((kind, row_id))
+            if entry is None:
+                return None
+            return max(0, entry[0] - entry[1] - entry[2] - entry[3])
+
+    def set_limit(self, kind: str, row_id: int, quota_total: int):
+        """更新账本中的总配额（管理员调整配额后调用）"""
+        with self._lock:
+            entry = self._entries.get((kind, row_id))
+            if entry is not None:
+                entry[0] = quota_total
+
+    def _run(self):
+        """同步线程主循环"""
+        while not self._stop_event.wait(self.reconcile_interval):
+            try:
+                with self._app.app_context():
+                    self.reconcile()
+            except Exception as e:
+                logger.error(f"配额账本同步失败: {e}")
+
+    def reconcile(self) -> int:
+        """
+        把未同步的增量写入数据库（调用方需处于应用上下文中）
+
+        Returns:
+            int: 写入的记录数
+        """
+        from src.database.manager import db
+
+        with self._reconcile_lock:
+            previous = None
+            with self._lock:
+                batch: Dict[str, Dict[int, int]] = {kind: {} for kind in KINDS}
+                for (kind, row_id), entry in self._entries.items():
+                    if entry[3]:
+                        batch[kind][row_id] = entry[3]
+                        entry[2] += entry[3]
+                        entry[3] = 0
+                if any(batch.values()) and self._segment_path is not None:
+                    self._unapplied_segments.append(self._segment_path)
+                    previous = self._open_segment()
+                segments = list(self._unapplied_segments)
+            # 应用到数据库之前先把切换下来的日志段刷到磁盘
+            self._close_segment(previous)
+
+            if not any(batch.values()) and not segments:
+                self._refresh()
+                return 0
+
+            try:
+                self._apply(batch, segments)
+            except Exception:
+                db.session.rollback()
+                # 增量放回未同步部分，日志段保留到下一次同步
+                with self._lock:
+                    for kind, deltas in batch.items():
+                        for row_id, amount in deltas.items():
+                            entry = self._entries[(kind, row_id)]
+                            entry[2] -= amount
+                            entry[3] += amount
+                    self._failed_reconciles += 1
+                raise
+
+            with self._lock:
+                for kind, deltas in batch.items():
+                    for row_id, amount in deltas.items():
+                        entry = self._entries[(kind, row_id)]
+                        entry[1] += amount
+                        entry[2] -= amount
+                self._unapplied_segments = [s for s in self._unapplied_segments if s not in segments]
+                self._reconciles += 1
+            self._remove_segments(segments)
+            self._refresh()
+            count = sum(len(deltas) for deltas in batch.values())
+            logger.debug(f"配额账本同步完成，记录数: {count}，日志段数: {len(segments)}")
+            return count
+
+    @staticmethod
+    def _apply(batch: Dict[str, Dict[int, int]], segments: List[str]):
+        """在一个事务中应用增量并写入日志段标记"""
+        from src.database.manager import db
+        from src.models.quota import SystemConfig
+
+        for kind, deltas in batch.items():
+            if not deltas:
+                continue
+            table = _table(kind)
+            db.session.execute(
+                update(table)
+                .where(table.c.id.in_(list(deltas)))
+                .values(quota_used=table.c.quota_used + case(deltas, value=table.c.id))
+            )
+        for segment in segments:
+            db.session.add(SystemConfig(key=MARKER_PREFIX + os.path.basename(segment), value='applied'))
+        db.session.commit()
+
+    @staticmethod
+    def _remove_segments(segments: List[str], extra_markers: Optional[List[str]] = None):
+        """删除已应用的日志段文件及其标记（extra_markers为认领前原文件名的标记）"""
+        from src.database.manager import db
+        from src.models.quota import SystemConfig
+
+        for segment in segments:
+            try:
+                os.remove(segment)
+            except FileNotFoundError:
+                pass
+        markers = [MARKER_PREFIX + os.path.basename(s) for s in segments] + list(extra_markers or [])
+        try:
+            SystemConfig.query.filter(
+                SystemConfig.key.in_(markers)
+            ).delete(synchronize_session=False)
+            db.session.commit()
+        except Exception as e:
+            # 标记残留不影响正确性，下次重放时清理
+            db.session.rollback()
+            logger.warning(f"清理配额日志段标记失败: {e}")
+
+    def _refresh(self):
+        """重新读取账本中全部记录的数据库配额"""
+        from src.database.manager import db
+
+        with self._lock:
+            ids = {kind: [row_id for (k, row_id) in self._entries if k == kind] for kind in KINDS}
+        for kind, row_ids in ids.items():
+            table = _table(kind)
+            for start in range(0, len(row_ids), QUERY_CHUNK_SIZE):
+                chunk = row_ids[start:start + QUERY_CHUNK_SIZE]
+                rows = db.session.execute(
+                    select(table.c.id, table.c.quota_total, table.c.quota_used).where(table.c.id.in_(chunk))
+                ).all()
+                with self._lock:
+                    for row_id, quota_total, quota_used in rows:
+                        entry = self._entries.get((kind, row_id))
+                        # 同步进行中的记录在下一次同步后再刷新
+                        if entry is not None and not entry[2]:
+                            entry[0] = int(quota_total or 0)
+                            entry[1] = int(quota_used or 0)
+
+        # 重新读取已缓存用户的有效套餐，套餐变更在一个同步周期内生效
+        with self._lock:
+            user_ids = list(self._plans)
+        table = _table('plan')
+        for start in range(0, len(user_ids), QUERY_CHUNK_SIZE):
+            chunk = user_ids[start:start + QUERY_CHUNK_SIZE]
+            rows = db.session.execute(
+                select(table.c.user_id, table.c.id)
+                .where(table.c.user_id.in_(chunk), table.c.is_active.is_(True))
+            ).all()
+            active = {int(user_id): int(plan_id) for user_id, plan_id in rows}
+            with self._lock:
+                for user_id in chunk:
+                    if user_id in active:
+                        self._plans[user_id] = active[user_id]
+                    else:
+                        self._plans.pop(user_id, None)
+        db.session.commit()
+
+    @staticmethod
+    def _claim(path: str) -> Optional[str]:
+        """
+        通过重命名认领日志段，文件名中的进程ID改为本进程（重命名是原子操作，只有一个worker能成功）
+
+        Returns:
+            认领后的路径，已被其他worker认领时返回None
+        """
+        directory, name = os.path.split(path)
+        _, pid, rest = name[:-len('.log')].split('-', 2)
+        # 保留最初写入日志段的进程ID，认领后的文件名不会与其他日志段重复，多次认领时长度不变
+        if '.' not in rest:
+            rest = f"{rest}.{pid}"
+        claimed = os.path.join(directory, f"ledger-{os.getpid()}-{rest}.log")
+        try:
+            os.rename(path, claimed)
+        except FileNotFoundError:
+            return None
+        return claimed
+
+    @staticmethod
+    def _read_segment(path: str) -> Dict[str, Dict[int, int]]:
+        """读取日志段中累计的增量"""
+        batch: Dict[str, Dict[int, int]] = {kind: {} for kind in KINDS}
+        with open(path, 'rb') as f:
+            for line in f:
+                try:
+                    code, row_id, amount = line.decode('ascii').split()
+                    kind = CODE_KINDS[code]
+                    deltas = batch[kind]
+                    deltas[int(row_id)] = deltas.get(int(row_id), 0) + int(amount)
+                except (ValueError, KeyError, UnicodeDecodeError):
+                    # 崩溃时写了一半的最后一行
+                    logger.warning(f"跳过无效的配额日志记录: {path}")
+        return batch
+
+    def replay(self) -> int:
+        """
+        重放已退出进程留下的日志段（调用方需处于应用上下文中）
+
+        每个日志段先认领再单独应用；认领前已应用过（存在原文件名的标记）的日志段只删除。
+        标记冲突说明其他worker已应用该日志段，回滚后跳过。
+
+        Returns:
+            int: 重放的日志段数
+        """
+        from src.database.manager import db
+        from src.models.quota import SystemConfig
+
+        replayed = 0
+        skipped = 0
+        for path in sorted(glob.glob(os.path.join(self.journal_dir, 'ledger-*-*.log'))):
+            try:
+                pid = int(os.path.basename(path).split('-')[1])
+            except (IndexError, ValueError):
+                continue
+            if path == self._segment_path or _pid_alive(pid):
+                continue
+            claimed = self._claim(path)
+            if claimed is None:
+                continue
+
+            marker = MARKER_PREFIX + os.path.basename(path)
+            if SystemConfig.query.filter_by(key=marker).first() is not None:
+                skipped += 1
+            else:
+                try:
+                    self._apply(self._read_segment(claimed), [claimed])
+                    replayed += 1
+                except IntegrityError:
+                    db.session.rollback()
+                    logger.warning(f"配额日志段已由其他worker应用，跳过: {os.path.basename(path)}")
+                    skipped += 1
+            self._remove_segments([claimed], extra_markers=[marker])
+
+        if replayed or skipped:
+            with self._lock:
+                self._replayed_segments += replayed
+            logger.info(f"配额账本重放完成，日志段数: {replayed}，已应用过的日志段: {skipped}")
+        return replayed
+
+    def stop(self):
+        """停止同步线程，写入剩余增量并关闭日志段"""
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._thread.join(timeout=self.reconcile_interval + 5)
+        self._thread = None
+        try:
+            with self._app.app_context():
+                self.reconcile()
+        except Exception as e:
+            logger.error(f"退出时配额账本同步失败，增量保留在日志中，下次启动时重放: {e}")
+        with self._lock:
+            self._close_segment(self._journal)
+            self._journal = None
+            # 空日志段直接删除
+            if self._segment_path and os.path.exists(self._segment_path) \
+                    and os.path.getsize(self._segment_path) == 0:
+                os.remove(self._segment_path)
+
+    def stats(self) -> dict:
+        """获取账本统计"""
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'entries': len(self._entries),
+                'plans': len(self._plans),
+                'pending': sum(entry[3] for entry in self._entries.values()),
+                'deductions': self._deductions,
+                'rejections': self._rejections,
+                'reconciles': self._reconciles,
+                'failed_reconciles': self._failed_reconciles,
+                'replayed_segments': self._replayed_segments,
+                'unapplied_segments': len(self._unapplied_segments)
+            }
+
+
+def _create_ledger() -> QuotaLedger:
+    """根据配置创建全局配额账本"""
+    try:
+        from config import config
+        return QuotaLedger(
+            journal_dir=getattr(config, 'QUOTA_LEDGER_JOURNAL_DIR', os.path.join('instance', 'quota_journal')),
+            reconcile_interval=getattr(config, 'QUOTA_LEDGER_RECONCILE_INTERVAL', 2),
+            enabled=getattr(config, 'QUOTA_LEDGER_ENABLED', False)
+        )
+    except ImportError:
+        return QuotaLedger(os.path.join('instance', 'quota_journal'))
+
+
+# 进程内共享的配额账本
+quota_ledger = _create_ledger()
@@ -10,13 +10,15 @@ from typing import Optional, Dict, Any, Tuple
 from flask import current_app, request
 from flask_jwt_extended import create_access_token, create_refresh_token, jwt_required, get_jwt_identity, get_jwt
 import jwt
-from sqlalchemy import or_
+from sqlalchemy import or_, select, update
 from sqlalchemy.sql.elements import BooleanClauseList
 from sqlalchemy.sql.expression import ColumnElement
 from src.database.manager import db
 from src.models.user import User, Admin, UserPlan, APIKey
 from src.models.quota import JWTToken, SystemConfig
 from src.models.api import Plan, Order
+from src.auth.key_cache import ResolvedAPIKey, api_key_cache
+from src.auth.quota_ledger import quota_ledger
 from src.utils.helpers import validate_email, validate_password, create_success_response, create_error_response
 from flask import Response
 
@@ -101,6 +103,9 @@ class AuthService:
                 db.session.add(user_plan)
             
             db.session.commit()
+            if free_plan:
+                # 套餐变更后账本中的用户套餐映射失效
+                quota_ledger.invalidate_plan(user.id)
             
             # 创建JWT令牌
             access_token = self.create_access_token(user)
@@ -335,6 +340,42 @@ class AuthService:
         except Exception:
             return None
     
+    def resolve_api_key(self, api_key: str) -> Optional[ResolvedAPIKey]:
+        """
+        解析API Key，结果缓存在进程内
+
+        与verify_api_key的判定规则相同，命中缓存时不查询数据库。
+
+        Returns:
+            Optional[ResolvedAPIKey]: 解析结果，API Key无效时返回None
+        """
+        if not api_key:
+            return None
+        
+        resolved = api_key_cache.get(api_key)
+        if resolved is not None:
+            return resolved
+        
+        try:
+            user = User.query.filter_by(api_key=api_key, status='active').first()
+            api_key_record = APIKey.query.filter_by(key=api_key, is_active=True).first()
+            if not user:
+                if not api_key_record:
+                    return None
+                user = api_key_record.user
+            
+            resolved = ResolvedAPIKey(
+                user_id=user.id,
+                user_status=user.status,
+                api_key_id=api_key_record.id if api_key_record else None,
+                quota_total=api_key_record.quota_total if api_key_record else None
+            )
+        except Exception:
+            return None
+        
+        api_key_cache.set(api_key, resolved)
+        return resolved
+    
     def get_api_key_info(self, user: User) -> Response:
         """获取API密钥信息"""
         try:
@@ -446,6 +487,9 @@ class AuthService:
             
             api_key.updated_at = datetime.now(timezone.utc)
             db.session.commit()
+            api_key_cache.invalidate(api_key.key)
+            if quota_total is not None:
+                quota_ledger.set_limit('api_key', api_key.id, quota_total)
             
             return create_success_response(api_key.to_dict())
         except Exception as e:
@@ -466,8 +510,10 @@ class AuthService:
                 return create_error_response("DELETE_DEFAULT_KEY_ERROR", "不能删除默认API密钥")
             
             # 删除API密钥
+            deleted_key = api_key.key
             db.session.delete(api_key)
             db.session.commit()
+            api_key_cache.invalidate(deleted_key)
             
             return create_success_response({"message": "API密钥删除成功"})
         except Exception as e:
@@ -488,7 +534,9 @@ class AuthService:
             
             # 同时更新用户的默认API密钥记录
             default_api_key = APIKey.query.filter_by(user_id=user.id, name='默认密钥').first()
+            old_default_key = None
             if default_api_key:
+                old_default_key = default_api_key.key
                 default_api_key.key = user.api_key
             else:
                 # 如果不存在默认密钥记录，则创建一个
@@ -509,6 +557,7 @@ class AuthService:
             )
             
             db.session.commit()
+            api_key_cache.invalidate(old_api_key, old_default_key)
             
             return create_success_response({
                 "api_key": user.api_key,
@@ -586,32 +635,49 @@ class AuthService:
     
     def check_user_quota(self, user: User) -> Tuple[bool, str]:
         """检查用户配额"""
-        user_plan = self.get_user_plan(user)
-        if not user_plan:
-            return False, "用户没有有效的套餐"
-        
-        if user_plan.quota_remaining <= 0:
+        # 启用配额账本时以账本中的剩余配额为准（数据库中的已用配额定期同步）
+        if quota_ledger.running:
+            plan_id = quota_ledger.active_plan(user.id)
+            if plan_id is None:
+                return False, "用户没有有效的套餐"
+            remaining = quota_ledger.remaining('plan', plan_id)
+        else:
+            remaining = None
+        if remaining is None:
+            user_plan = self.get_user_plan(user)
+            if not user_plan:
+                return False, "用户没有有效的套餐"
+            remaining = user_plan.quota_remaining
+        if remaining <= 0:
             return False, "配额已用完，请升级套餐"
         
         return True, ""
     
     def deduct_user_quota(self, user: User, amount: int = 1) -> bool:
-        """扣减用户配额"""
+        """
+        扣减用户配额
+
+        用一条条件UPDATE完成检查和扣减，配额不足或没有有效套餐时影响行数为0，并发请求不会超扣。
+        """
         try:
-            user_plan = self.get_user_plan(user)
-            if user_plan:
-                if user_plan.quota_total - user_plan.quota_used >= amount:
-                    user_plan.quota_used += amount
-                    success = True
-                else:
-                    success = False
-            else:
-                success = False
+            if quota_ledger.running:
+                # 用户到套餐的映射和配额都在账本内存中，稳定状态下不查询数据库
+                plan_id = quota_ledger.active_plan(user.id)
+                if plan_id is None:
+                    return False
+                return quota_ledger.deduct('plan', plan_id, amount)
 
-            if success:
-                db.session.commit()
-                return True
-            return False
+            table = UserPlan.__table__
+            active_plan_id = select(table.c.id).where(
+                table.c.user_id == user.id, table.c.is_active.is_(True)
+            ).limit(1).scalar_subquery()
+            result = db.session.execute(
+                update(table)
+                .where(table.c.id == active_plan_id, table.c.quota_used + amount <= table.c.quota_total)
+                .values(quota_used=table.c.quota_used + amount)
+            )
+            db.session.commit()
+            return result.rowcount == 1
             
         except Exception as e:
             print(f"扣减用户配额失败: {e}")
@@ -620,26 +686,30 @@ class AuthService:
     
     def deduct_api_key_quota(self, api_key: APIKey, amount: int = 1) -> bool:
         """扣减API密钥配额"""
-        try:
-            if not api_key.is_active:
-                return False
-
-            # 扣减配额
-            if hasattr(api_key, 'deduct_quota') and callable(api_key.deduct_quota):
-                success = api_key.deduct_quota(amount)
-            else:
-                # 回退逻辑
-                if api_key.quota_total - api_key.quota_used >= amount:
-                    api_key.quota_used += amount
-                    success = True
-                else:
-                    success = False
-
-            if success:
-                api_key.last_used_at = datetime.now(timezone.utc)
-                db.session.commit()
-                return True
+        if not api_key.is_active:
             return False
+        if quota_ledger.running:
+            return quota_ledger.deduct('api_key', api_key.id, amount,
+                                       seed=(api_key.quota_total, api_key.quota_used or 0))
+        return self.deduct_api_key_quota_by_id(api_key.id, amount)
+    
+    def deduct_api_key_quota_by_id(self, api_key_id: int, amount: int = 1) -> bool:
+        """
+        按ID扣减API密钥配额
+
+        用一条条件UPDATE完成检查和扣减，不加载密钥记录；配额不足时影响行数为0，并发请求不会超扣。
+        """
+        if quota_ledger.running:
+            return quota_ledger.deduct('api_key', api_key_id, amount)
+        try:
+            table = APIKey.__table__
+            result = db.session.execute(
+                update(table)
+                .where(table.c.id == api_key_id, table.c.quota_used + amount <= table.c.quota_total)
+                .values(quota_used=table.c.quota_used + amount)
+            )
+            db.session.commit()
+            return result.rowcount == 1
             
         except Exception as e:
             print(f"扣减API密钥配额失败: {e}")
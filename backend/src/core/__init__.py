@@ -2,5 +2,6 @@
 
 from .cemotion import Cemotion
 from .segmentor import TextSegmentor
+from .batcher import DynamicBatcher
 
-__all__ = ['Cemotion', 'TextSegmentor']
\ No newline at end of file
+__all__ = ['Cemotion', 'TextSegmentor', 'DynamicBatcher']
\ No newline at end of file
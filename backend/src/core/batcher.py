@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+动态批处理模块
+将并发到达的单文本请求合并为批量推理
+"""
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Callable, List, Optional
+
+logger = logging.getLogger('SentiScore')
+
+
+class DynamicBatcher:
+    """
+    动态请求合并队列
+
+    请求线程调用 submit() 将文本放入队列并拿到一个Future；后台线程收集队列中的请求，
+    直到凑满 max_batch_size 条或等待超过 max_wait_ms 毫秒，然后执行一次批量推理，
+    再把每条结果分别写回对应的Future。
+
+    max_wait_ms 越大，单次合并的批次越大、吞吐越高，但单个请求的额外等待也越长；
+    设为0时不主动等待，只合并已经在队列中的请求。
+    """
+
+    def __init__(self, predict_fn: Callable[[List[str]], List[float]], max_batch_size: int = 16,
+                 max_wait_ms: float = 5.0, timeout: Optional[float] = None):
+        """
+        初始化动态批处理器
+
+        Args:
+            predict_fn: 批量推理函数，输入文本列表，返回等长的分数列表
+            max_batch_size: 单个批次的最大文本数
+            max_wait_ms: 收集批次的最长等待时间（毫秒）
+            timeout: 调用方等待结果的超时时间（秒），None表示不限制
+        """
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.timeout = timeout
+
+        self._queue: queue.Queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._running = True
+
+        # 统计信息
+        self._submitted = 0
+        self._batches = 0
+        self._batched_items = 0
+        self._failed_batches = 0
+        self._max_queue_depth = 0
+        self._last_batch_size = 0
+
+        self._worker = threading.Thread(target=self._run, name='dynamic-batcher', daemon=True)
+        self._worker.start()
+        logger.info(f"动态批处理器已启动，最大批次: {self.max_batch_size}，最长等待: {max_wait_ms}ms")
+
+    def submit(self, text: str) -> Future:
+        """
+        提交单条文本，返回结果Future
+
+        Args:
+            text: 待分析的文本
+
+        Returns:
+            Future: 完成后结果为该文本的情感分数
+        """
+        future: Future = Future()
+        # 检查状态和入队在同一把锁内完成，shutdown之后不会再有请求排在停止信号后面
+        with self._lock:
+            if not self._running:
+                raise RuntimeError("动态批处理器已停止")
+            self._queue.put((text, future))
+            self._submitted += 1
+            depth = self._queue.qsize()
+            if depth > self._max_queue_depth:
+                self._max_queue_depth = depth
+        return future
+
+    def predict(self, text: str) -> float:
+        """提交文本并阻塞等待结果"""
+        return self.submit(text).result(timeout=self.timeout)
+
+    def _collect(self, first) -> list:
+        """从第一条请求开始收集一个批次"""
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    item = self._queue.get(timeout=remaining)
+                else:
+                    # 等待时间已到，只取队列中已有的请求
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # 停止信号放回队列，由主循环处理
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        """后台线程主循环"""
+        while True:
+            first = self._queue.get()
+            if first is None:
+                break
+
+            batch = self._collect(first)
+            texts = [text for text, _ in batch]
+            try:
+                scores = self.predict_fn(texts)
+                # 分数数量不一致时无法对应到请求，整批按失败处理，避免部分请求永远等不到结果
+                if len(scores) != len(batch):
+                    raise RuntimeError(f"推理结果数量({len(scores)})与批次大小({len(batch)})不一致")
+                for (_, future), score in zip(batch, scores):
+                    future.set_result(score)
+                with self._lock:
+                    self._batches += 1
+                    self._batched_items += len(batch)
+                    self._last_batch_size = len(batch)
+                logger.debug(f"动态批次完成，批次大小: {len(batch)}，剩余队列深度: {self._queue.qsize()}")
+            except Exception as e:
+                logger.error(f"动态批次推理失败，批次大小: {len(batch)}，错误: {e}")
+                with self._lock:
+                    self._failed_batches += 1
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def stats(self) -> dict:
+        """获取队列深度和批处理统计"""
+        with self._lock:
+            return {
+                'running': self._running,
+                'queue_depth': self._queue.qsize(),
+                'max_queue_depth': self._max_queue_depth,
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': round(self.max_wait * 1000, 3),
+                'submitted': self._submitted,
+                'batches': self._batches,
+                'failed_batches': self._failed_batches,
+                'last_batch_size': self._last_batch_size,
+                'avg_batch_size': round(self._batched_items / self._batches, 2) if self._batches else 0.0
+            }
+
+    def shutdown(self, wait: bool = True):
+        """停止后台线程，已入队的请求会先处理完；等待结束后仍未处理的请求以异常结束"""
+        with self._lock:
+            if not self._running:
+                return
+            self._running = False
+            self._queue.put(None)
+        if wait:
+            self._worker.join()
+            leftover = 0
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not None and not item[1].done():
+                    item[1].set_exception(RuntimeError("动态批处理器已停止"))
+                    leftover += 1
+            if leftover:
+                logger.warning(f"动态批处理器停止时有{leftover}条请求未处理")
+        logger.info("动态批处理器已停止")
@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+"""
+结果缓存模块
+按文本内容寻址的LRU缓存，用于复用重复文本的分析结果
+"""
+import os
+import json
+import atexit
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Optional
+
+logger = logging.getLogger('SentiScore')
+
+
+def make_cache_key(namespace: str, version: str, text: str) -> str:
+    """计算缓存键：命名空间 + 模型版本 + 文本的SHA-256摘要"""
+    raw = f"{namespace}\x00{version}\x00{text}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class SQLiteResultStore:
+    """
+    基于SQLite WAL文件的跨进程结果存储
+
+    多个gunicorn worker打开同一个数据库文件即可共享结果：WAL模式下不同进程的读写互不阻塞。
+    进程内所有线程共用一个连接（加锁访问），避免每个请求线程各自打开连接；进程退出时关闭。值以JSON保存，带过期时间，超过容量时淘汰最早写入的条目。
+    任何实现了 get(key) / set(key, value) 的对象（例如Redis客户端的封装）都可以替代它。
+    """
+
+    # 每写入多少次执行一次过期和容量清理
+    PRUNE_INTERVAL = 1000
+
+    def __init__(self, path: str, ttl_seconds: int = 86400, max_entries: int = 100000):
+        """
+        初始化共享结果存储
+
+        Args:
+            path: SQLite数据库文件路径
+            ttl_seconds: 条目有效期（秒）
+            max_entries: 最大条目数
+        """
+        self.path = os.path.abspath(path)
+        self.ttl_seconds = max(1, int(ttl_seconds))
+        self.max_entries = max(1, int(max_entries))
+
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        # 共享连接的访问锁
+        self._conn_lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._writes = 0
+        self._hits = 0
+        self._misses = 0
+        self._errors = 0
+
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS results ('
+            'key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_results_expires_at ON results (expires_at)')
+        self._conn.commit()
+        atexit.register(self.close)
+        logger.info(f"共享结果缓存已启用: {self.path}，TTL: {self.ttl_seconds}秒，容量: {self.max_entries}")
+
+    def get(self, key: str) -> Optional[Any]:
+        """读取未过期的结果，不存在时返回None"""
+        try:
+            with self._conn_lock:
+                if self._conn is None:
+                    return None
+                row = self._conn.execute(
+                    'SELECT value FROM results WHERE key = ? AND expires_at > ?',
+                    (key, time.time())
+                ).fetchone()
+        except sqlite3.Error as e:
+            with self._lock:
+                self._errors += 1
+            logger.warning(f"共享结果缓存读取失败: {e}")
+            return None
+
+        with self._lock:
+            if row is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+        return json.loads(row[0]) if row is not None else None
+
+    def set(self, key: str, value: Any):
+        """写入结果"""
+        try:
+            with self._conn_lock:
+                if self._conn is None:
+                    return
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO results (key, value, expires_at) VALUES (?, ?, ?)',
+                    (key, json.dumps(value, ensure_ascii=False), time.time() + self.ttl_seconds)
+                )
+                self._conn.commit()
+        except sqlite3.Error as e:
+            with self._lock:
+                self._errors += 1
+            logger.warning(f"共享结果缓存写入失败: {e}")
+            return
+
+        with self._lock:
+            self._writes += 1
+            need_prune = self._writes % self.PRUNE_INTERVAL == 0
+        if need_prune:
+            self.prune()
+
+    def prune(self):
+        """删除过期条目，并在超出容量时淘汰最早写入的条目"""
+        try:
+            with self._conn_lock:
+                if self._conn is None:
+                    return
+                self._conn.execute('DELETE FROM results WHERE expires_at <= ?', (time.time(),))
+                count = self._conn.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+                if count > self.max_entries:
+                    self._conn.execute(
+                        'DELETE FROM results WHERE key IN '
+                        '(SELECT key FROM results ORDER BY expires_at LIMIT ?)',
+                        (count - self.max_entries,)
+                    )
+                self._conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"共享结果缓存清理失败: {e}")
+
+    def close(self):
+        """关闭共享连接，之后的读写直接跳过"""
+        with self._conn_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def stats(self) -> dict:
+        """获取共享缓存统计"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'backend': 'sqlite',
+                'path': self.path,
+                'ttl_seconds': self.ttl_seconds,
+                'max_entries': self.max_entries,
+                'hits': self._hits,
+                'misses': self._misses,
+                'writes': self._writes,
+                'errors': self._errors,
+                'hit_rate': round(self._hits / lookups, 4) if lookups else 0.0
+            }
+
+
+def create_shared_store(config) -> Optional[SQLiteResultStore]:
+    """根据配置创建共享结果存储，未启用或创建失败时返回None"""
+    if not config or not getattr(config, 'SHARED_CACHE_ENABLED', False):
+        return None
+    try:
+        return SQLiteResultStore(
+            config.SHARED_CACHE_PATH,
+            ttl_seconds=getattr(config, 'SHARED_CACHE_TTL', 86400),
+            max_entries=getattr(config, 'SHARED_CACHE_MAX_ENTRIES', 100000)
+        )
+    except Exception as e:
+        logger.error(f"共享结果缓存初始化失败: {e}")
+        return None
+
+
+class ResultCache:
+    """
+    线程安全的LRU结果缓存
+
+    缓存键为 命名空间 + 模型版本 + 规范化文本 的SHA-256摘要，
+    模型版本变化后旧结果自然失效。配置了共享存储时，本地未命中会继续查询共享存储，
+    命中后回填到本地；写入时同时写入本地和共享存储。
+    """
+
+    def __init__(self, max_size: int = 1000, namespace: str = 'default', version: str = '',
+                 shared=None):
+        """
+        初始化结果缓存
+
+        Args:
+            max_size: 最大缓存条目数，超出后淘汰最久未使用的条目
+            namespace: 命名空间，区分不同类型的结果
+            version: 模型版本标识
+            shared: 可选的跨进程共享存储（需实现get/set）
+        """
+        self.max_size = max(1, int(max_size))
+        self.namespace = namespace
+        self.version = version
+        self.shared = shared
+
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+        self._hits = 0
+        self._shared_hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    @staticmethod
+    def normalize_text(text: str) -> str:
+        """规范化文本（去除首尾空白，分词器同样会忽略首尾空白）"""
+        return text.strip()
+
+    def make_key(self, text: str) -> str:
+        """计算文本的缓存键"""
+        return make_cache_key(self.namespace, self.version, self.normalize_text(text))
+
+    def get(self, text: str) -> Optional[Any]:
+        """
+        查询缓存
+
+        Args:
+            text: 原始文本
+
+        Returns:
+            缓存的结果，未命中时返回None
+        """
+        key = self.make_key(text)
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+                self._hits += 1
+                return value
+
+        if self.shared is not None:
+            value = self.shared.get(key)
+            if value is not None:
+                self._store(key, value)
+                with self._lock:
+                    self._shared_hits += 1
+                return value
+
+        with self._lock:
+            self._misses += 1
+        return None
+
+    def set(self, text: str, value: Any):
+        """
+        写入缓存
+
+        Args:
+            text: 原始文本
+            value: 分析结果（不能为None）
+        """
+        if value is None:
+            return
+        key = self.make_key(text)
+        self._store(key, value)
+        if self.shared is not None:
+            self.shared.set(key, value)
+
+    def _store(self, key: str, value: Any):
+        """写入本地LRU并执行淘汰"""
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self._evictions += 1
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        """获取命中、未命中和淘汰统计"""
+        with self._lock:
+            hits = self._hits + self._shared_hits
+            lookups = hits + self._misses
+            result = {
+                'namespace': self.namespace,
+                'size': len(self._data),
+                'max_size': self.max_size,
+                'hits': self._hits,
+                'shared_hits': self._shared_hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+                'hit_rate': round(hits / lookups, 4) if lookups else 0.0
+            }
+        if self.shared is not None and hasattr(self.shared, 'stats'):
+            result['shared'] = self.shared.stats()
+        return result
@@ -4,25 +4,42 @@
 基于cemotion库的情感分析实现
 """
 import os
+import copy
+import queue
+import bisect
+import random
 import logging
+import threading
+import contextlib
 from typing import Union, List, Tuple
+import torch
+import numpy as np
 from cemotion import Cemotion as CemotionBase
+from cemotion.app import tokenizer as cemotion_tokenizer
+from transformers import BertTokenizerFast
+from src.models.emotion_classifier import SentimentClassifier, load_model
+from src.core.cache import ResultCache, create_shared_store
+from src.core import onnx_backend
+from src.core.quantization import quantize_dynamic_int8
+from src.core.runtime import configure_inference_runtime, inference_context
 import time
 import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
-import hanlp
-from hanlp.utils.rules import split_sentence
+from src.utils.sentence_splitter import split_sentences
 
 logger = logging.getLogger('SentiScore')
 
 class EmotionResult:
     """情感分析结果类"""
-    def __init__(self, emotion_score: float, emotion: str, confidence: float, text_length: int):
+    def __init__(self, emotion_score: float, emotion: str, confidence: float, text_length: int,
+                 timings: dict = None):
         self.emotion_score = emotion_score
         self.emotion = emotion
         self.confidence = confidence
         self.text_length = text_length
+        # 各阶段耗时（毫秒），目前仅长文本分析提供
+        self.timings = timings or {}
 
 class APIError(Exception):
     """API错误类"""
@@ -48,9 +65,29 @@ class Cemotion:
             config: 配置对象，包含模型相关配置
         """
         self.model = None
+        self.device = None
+        self.checkpoint_path = None
+        self.onnx_session = None
+        self.quantization = None
+        self.tokenizer = None
+        # 快速分词器实例池（按需复制，数量不超过TOKENIZER_POOL_SIZE）
+        self._tokenizer_pool: queue.LifoQueue = queue.LifoQueue()
+        self._tokenizer_pool_lock = threading.Lock()
+        self._tokenizer_instances = 0
+        self.runtime_info = {}
         self.config = config
+        # 最近一次批量推理的分桶统计（调试用）
+        self.last_batch_stats = {}
+        # 情感分数结果缓存
+        self.result_cache = None
+        # 可选的多进程推理池（由应用在初始化后设置）
+        self.process_pool = None
         
         try:
+            # 在加载模型之前配置推理线程和CPU亲和性
+            if self.config:
+                self.runtime_info = configure_inference_runtime(self.config)
+            
             # 在初始化模型之前设置环境变量
             # 设置Hugging Face在线模式
             os.environ['HF_HUB_OFFLINE'] = '0'
@@ -72,33 +109,234 @@ class Cemotion:
             if self.config and hasattr(self.config, 'HF_CACHE_DIR'):
                 os.environ['HF_HOME'] = self.config.HF_CACHE_DIR
             
+            # 加载分词器（优先使用Rust实现的快速分词器）
+            self._load_tokenizer()
+            
             # 初始化Cemotion模型
             if self.config and hasattr(self.config, 'MODEL_CACHE_DIR') and self.config.MODEL_CACHE_DIR:
-                model_cache_dir = self.config.MODEL_CACHE_DIR
+                model_cache_dir = os.path.abspath(self.config.MODEL_CACHE_DIR)
                 # 确保目录存在
                 if not os.path.exists(model_cache_dir):
                     os.makedirs(model_cache_dir, exist_ok=True)
-                
-                # 保存当前工作目录
-                original_cwd = os.getcwd()
-                
-                # 切换到模型缓存目录
-                os.chdir(model_cache_dir)
-                
-                # 在指定目录初始化模型
-                self.model = CemotionBase()
+                self._load_model(model_cache_dir)
                 logger.info(f"情感分析模型加载成功，使用缓存目录: {model_cache_dir}")
-                
-                # 切换回原来的工作目录
-                os.chdir(original_cwd)
             else:
-                # 使用默认路径
-                self.model = CemotionBase()
+                # 使用默认路径（相对当前工作目录）
+                self._load_model(os.getcwd())
                 logger.info("情感分析模型加载成功（使用默认模型）")
         except Exception as e:
             logger.error(f"情感分析模型加载失败: {e}")
             raise
+        
+        # 按配置启用ONNX Runtime推理后端
+        if self.config and getattr(self.config, 'INFERENCE_BACKEND', 'torch') == 'onnx':
+            self._load_onnx_backend()
+        
+        # 按配置对PyTorch模型做动态int8量化
+        self._apply_quantization()
+        
+        # 初始化结果缓存
+        if self.config and getattr(self.config, 'RESULT_CACHE_ENABLED', False):
+            self.result_cache = ResultCache(
+                max_size=getattr(self.config, 'LRU_CACHE_SIZE', 1000),
+                namespace='sentiment',
+                version=self.model_version,
+                shared=create_shared_store(self.config)
+            )
+            logger.info(f"情感分数结果缓存已启用，容量: {self.result_cache.max_size}")
     
+    def _load_model(self, model_cache_dir: str):
+        """
+        按绝对路径加载cemotion模型权重
+
+        cemotion库只支持相对于当前工作目录的 .cemotion_cache/cemotion_2.0.pt，
+        这里在初始化时一次性解析出绝对路径并直接加载，推理路径不再依赖工作目录。
+
+        Args:
+            model_cache_dir: 模型缓存目录（其下包含 .cemotion_cache/cemotion_2.0.pt）
+        """
+        checkpoint_path = os.path.join(model_cache_dir, '.cemotion_cache', 'cemotion_2.0.pt')
+        self.checkpoint_path = checkpoint_path
+
+        # 有预量化模型时直接加载，跳过浮点权重
+        quantized_path = self._quantized_artifact_path()
+        if quantized_path:
+            self.device = torch.device('cpu')
+            # 权重全部来自预量化文件，只需按配置构建模型结构
+            model = quantize_dynamic_int8(SentimentClassifier(num_classes=1, pretrained=False))
+            model.load_state_dict(torch.load(quantized_path, map_location=self.device))
+            self.model = model.eval()
+            self.quantization = 'dynamic_int8'
+            logger.info(f"已加载预量化模型: {quantized_path}")
+            return
+
+        if os.path.exists(checkpoint_path):
+            if torch.cuda.is_available():
+                self.device = torch.device('cuda')
+            elif torch.backends.mps.is_available():
+                self.device = torch.device('mps')
+            else:
+                self.device = torch.device('cpu')
+
+            model = SentimentClassifier(num_classes=1)
+            self.model = load_model(model, checkpoint_path, self.device)
+            self.model.to(self.device)
+        else:
+            # 权重文件不存在时交给cemotion下载，只在初始化时切换一次工作目录
+            logger.info(f"未找到cemotion模型文件，开始下载: {checkpoint_path}")
+            original_cwd = os.getcwd()
+            try:
+                os.chdir(model_cache_dir)
+                base = CemotionBase()
+            finally:
+                os.chdir(original_cwd)
+            self.model = base.model
+            self.device = base.device
+
+        # SentimentClassifier构造后处于训练模式（from_pretrained只切换内部的bert），推理前必须关闭dropout
+        self.model.eval()
+
+    def _load_tokenizer(self):
+        """
+        加载与cemotion相同词表的BertTokenizerFast
+
+        快速分词器支持返回字符偏移，长文本只需整体编码一次，分句、分块和推理都复用同一份token；
+        加载失败时退回cemotion自带的分词器，长文本路径按句子逐条编码。
+        """
+        try:
+            self.tokenizer = BertTokenizerFast.from_pretrained(cemotion_tokenizer.name_or_path)
+            logger.info(f"已加载快速分词器: {cemotion_tokenizer.name_or_path}")
+        except Exception as e:
+            logger.warning(f"快速分词器加载失败，使用cemotion默认分词器: {e}")
+            self.tokenizer = cemotion_tokenizer
+
+    @contextlib.contextmanager
+    def _borrow_tokenizer(self):
+        """
+        借出一个分词器实例用于编码或填充，用完后归还
+
+        快速分词器的Rust对象在编码时会修改截断/填充设置，批处理线程、请求线程和长文本路径
+        并发使用同一个实例会报 "Already borrowed"。实例池中的分词器按需复制，最多TOKENIZER_POOL_SIZE个，
+        全部借出时等待归还；cemotion自带的分词器没有这个问题，直接共用。
+        """
+        if not getattr(self.tokenizer, 'is_fast', False):
+            yield self.tokenizer
+            return
+        try:
+            tokenizer = self._tokenizer_pool.get_nowait()
+        except queue.Empty:
+            tokenizer = None
+            pool_size = max(1, getattr(self.config, 'TOKENIZER_POOL_SIZE', 4)) if self.config else 4
+            with self._tokenizer_pool_lock:
+                if self._tokenizer_instances < pool_size:
+                    first = self._tokenizer_instances == 0
+                    self._tokenizer_instances += 1
+                    tokenizer = self.tokenizer if first else copy.deepcopy(self.tokenizer)
+            if tokenizer is None:
+                tokenizer = self._tokenizer_pool.get()
+        try:
+            yield tokenizer
+        finally:
+            self._tokenizer_pool.put(tokenizer)
+
+    @property
+    def max_length(self) -> int:
+        """单个模型输入的最大token数（含[CLS]和[SEP]）"""
+        return getattr(self.config, 'BATCH_MAX_LENGTH', 128) if self.config else 128
+
+    def _quantized_artifact_path(self):
+        """返回可用的预量化模型路径（仅PyTorch后端的dynamic_int8模式），否则返回None"""
+        if not self.config or getattr(self.config, 'QUANTIZATION_MODE', 'none') != 'dynamic_int8':
+            return None
+        if getattr(self.config, 'INFERENCE_BACKEND', 'torch') != 'torch':
+            return None
+        path = getattr(self.config, 'QUANTIZED_MODEL_PATH', '')
+        return path if path and os.path.exists(path) else None
+
+    def _apply_quantization(self):
+        """
+        对已加载的浮点模型做动态int8量化
+
+        只量化线性层，仅在PyTorch后端且运行在CPU上时生效；启用ONNX后端时不做量化。
+        """
+        mode = getattr(self.config, 'QUANTIZATION_MODE', 'none') if self.config else 'none'
+        if mode != 'dynamic_int8' or self.quantization:
+            return
+        if self.onnx_session is not None:
+            logger.warning("已启用ONNX推理后端，忽略QUANTIZATION_MODE配置")
+            return
+        if self.device is None or self.device.type != 'cpu':
+            logger.warning(f"动态int8量化仅支持CPU推理，当前设备: {self.device}，继续使用浮点模型")
+            return
+
+        try:
+            self.model = quantize_dynamic_int8(self.model)
+            self.quantization = mode
+            logger.info("已对情感分析模型做动态int8量化")
+        except Exception as e:
+            logger.error(f"动态int8量化失败，继续使用浮点模型: {e}")
+
+    def _load_onnx_backend(self):
+        """
+        加载ONNX Runtime推理后端
+
+        ONNX模型不存在时从已加载的PyTorch权重导出一次。加载后用预热文本对比两个后端的分数，
+        差异超过ONNX_TOLERANCE时放弃ONNX后端，继续使用PyTorch推理。
+        """
+        if not onnx_backend.is_available():
+            logger.warning("未安装onnxruntime，继续使用PyTorch推理后端")
+            return
+
+        onnx_path = getattr(self.config, 'ONNX_MODEL_PATH', None) or \
+            os.path.splitext(self.checkpoint_path)[0] + '.onnx'
+        tolerance = getattr(self.config, 'ONNX_TOLERANCE', 1e-3)
+
+        try:
+            if not os.path.exists(onnx_path):
+                logger.info(f"未找到ONNX模型，开始导出: {onnx_path}")
+                onnx_backend.export_onnx_model(self.model, onnx_path, self.device)
+            session = onnx_backend.OnnxSentimentSession(
+                onnx_path, intra_op_threads=self.runtime_info.get('intra_op_threads')
+            )
+
+            # 校验ONNX与PyTorch的分数差异
+            texts = getattr(self.config, 'WARMUP_TEXTS', None) or ["这个产品非常好，我很喜欢"]
+            encoded = self._encode(texts)
+            features = {key: encoded[key] for key in ('input_ids', 'attention_mask', 'token_type_ids')}
+            torch_scores = self._forward_torch(features)
+            onnx_scores = self._forward_onnx(features, session)
+            max_diff = max(abs(a - b) for a, b in zip(torch_scores, onnx_scores))
+            if max_diff > tolerance:
+                logger.warning(f"ONNX与PyTorch分数差异{max_diff:.6f}超过容差{tolerance}，继续使用PyTorch推理后端")
+                return
+
+            self.onnx_session = session
+            logger.info(f"ONNX推理后端加载成功: {onnx_path}，与PyTorch最大分数差异: {max_diff:.6f}")
+        except Exception as e:
+            logger.error(f"ONNX推理后端加载失败，继续使用PyTorch推理后端: {e}")
+
+    @property
+    def backend(self) -> str:
+        """当前推理后端名称"""
+        return 'onnx' if self.onnx_session is not None else 'torch'
+
+    @property
+    def model_version(self) -> str:
+        """当前模型版本标识（含推理后端和量化模式），用于区分缓存结果"""
+        version = getattr(self.config, 'MODEL_VERSION', 'cemotion-2.0') if self.config else 'cemotion-2.0'
+        version = f"{version}+{self.backend}"
+        if self.quantization:
+            version = f"{version}+{self.quantization}"
+        return version
+
+    def get_runtime_info(self) -> dict:
+        """获取推理运行时信息（线程配置、后端、量化模式）"""
+        info = dict(self.runtime_info)
+        info['backend'] = self.backend
+        info['quantization'] = self.quantization or 'none'
+        info['device'] = str(self.device) if self.device is not None else None
+        return info
+
     def validate_input(self, text: str) -> Tuple[bool, Union[APIError, None]]:
         """
         验证输入参数
@@ -124,6 +362,218 @@ class Cemotion:
         # 这里可以添加其他验证逻辑
         return True, None
 
+    def _encode(self, texts: List[str]) -> dict:
+        """
+        对文本列表分词（不填充），按BATCH_MAX_LENGTH截断
+
+        Args:
+            texts: 文本列表
+
+        Returns:
+            dict: 包含input_ids、attention_mask、token_type_ids的逐条编码结果
+        """
+        with self._borrow_tokenizer() as tokenizer:
+            return tokenizer(
+                texts,
+                add_special_tokens=True,
+                max_length=self.max_length,
+                truncation=True
+            )
+
+    def encode_document(self, text: str) -> Union[dict, None]:
+        """
+        对整篇文本做一次分词，保留每个token在原文中的字符偏移
+
+        Args:
+            text: 原始文本
+
+        Returns:
+            dict: input_ids（不含特殊token）和offsets（[起始, 结束)字符位置）；
+                  分词器不支持偏移时返回None
+        """
+        if not getattr(self.tokenizer, 'is_fast', False):
+            return None
+        with self._borrow_tokenizer() as tokenizer:
+            encoded = tokenizer(
+                text,
+                add_special_tokens=False,
+                return_offsets_mapping=True,
+                return_attention_mask=False,
+                return_token_type_ids=False
+            )
+        return {
+            'input_ids': encoded['input_ids'],
+            'offsets': [tuple(offset) for offset in encoded['offset_mapping']]
+        }
+
+    def _build_features(self, id_lists: List[List[int]]) -> dict:
+        """
+        由不含特殊token的input_ids构造模型输入（补[CLS]/[SEP]，单句输入的token_type_ids全为0）
+
+        Args:
+            id_lists: 逐条的input_ids
+
+        Returns:
+            dict: 与tokenizer输出格式一致的逐条编码结果
+        """
+        cls_id = self.tokenizer.cls_token_id
+        sep_id = self.tokenizer.sep_token_id
+        input_ids = [[cls_id] + list(ids[:self.max_length - 2]) + [sep_id] for ids in id_lists]
+        return {
+            'input_ids': input_ids,
+            'attention_mask': [[1] * len(ids) for ids in input_ids],
+            'token_type_ids': [[0] * len(ids) for ids in input_ids]
+        }
+
+    def _forward(self, features: dict) -> List[float]:
+        """
+        将一个微批次填充到批次内最长长度后执行一次前向传播
+
+        Args:
+            features: 逐条编码结果（input_ids、attention_mask、token_type_ids）
+
+        Returns:
+            List[float]: 与输入顺序一致的情感分数列表
+        """
+        if self.onnx_session is not None:
+            return self._forward_onnx(features, self.onnx_session)
+        return self._forward_torch(features)
+
+    def _forward_torch(self, features: dict) -> List[float]:
+        """使用PyTorch执行一次前向传播"""
+        # attention_mask保证填充位置不影响结果
+        with self._borrow_tokenizer() as tokenizer:
+            padded = tokenizer.pad(features, padding=True, return_tensors='pt')
+
+        device = self.device
+        with inference_context(self.runtime_info.get('inference_mode', True)):
+            outputs = self.model(
+                input_ids=padded['input_ids'].to(device),
+                attention_mask=padded['attention_mask'].to(device),
+                token_type_ids=padded['token_type_ids'].to(device)
+            ).squeeze(1)
+            probabilities = torch.sigmoid(outputs).cpu().tolist()
+
+        return self._to_scores(probabilities)
+
+    def _forward_onnx(self, features: dict, session) -> List[float]:
+        """使用ONNX Runtime执行一次前向传播"""
+        with self._borrow_tokenizer() as tokenizer:
+            padded = tokenizer.pad(features, padding=True, return_tensors='np')
+        logits = session.run(padded['input_ids'], padded['attention_mask'], padded['token_type_ids'])
+        probabilities = (1.0 / (1.0 + np.exp(-logits))).tolist()
+        return self._to_scores(probabilities)
+
+    @staticmethod
+    def _to_scores(probabilities: List[float]) -> List[float]:
+        """与cemotion原始接口保持一致：保留6位小数并限制在0-1之间"""
+        return [max(0.0, min(1.0, round(float(p), 6))) for p in probabilities]
+
+    def _infer_batch(self, texts: List[str]) -> List[float]:
+        """
+        对文本列表分词后按长度分桶执行批量推理
+
+        Args:
+            texts: 待分析的文本列表
+
+        Returns:
+            List[float]: 与输入顺序一致的情感分数列表
+        """
+        if not texts:
+            return []
+        return self._infer_encoded(self._encode(texts))
+
+    def _infer_encoded(self, encoded: dict) -> List[float]:
+        """
+        对已编码的输入按长度分桶执行批量推理
+
+        先统计每条输入的token长度，按长度排序后切分为BATCH_SIZE大小的微批次，
+        使同一微批次内的输入长度相近以减少填充计算，最后按原始顺序回填结果。
+
+        Args:
+            encoded: 逐条编码结果（input_ids、attention_mask、token_type_ids）
+
+        Returns:
+            List[float]: 与输入顺序一致的情感分数列表
+        """
+        count = len(encoded['input_ids'])
+        if not count:
+            return []
+
+        batch_size = max(1, getattr(self.config, 'BATCH_SIZE', 16)) if self.config else 16
+        lengths = [len(ids) for ids in encoded['input_ids']]
+        order = sorted(range(count), key=lambda i: lengths[i])
+
+        scores = [0.5] * count
+        buckets = []
+        for start in range(0, len(order), batch_size):
+            bucket = order[start:start + batch_size]
+            features = {
+                key: [encoded[key][i] for i in bucket]
+                for key in ('input_ids', 'attention_mask', 'token_type_ids')
+            }
+            for index, score in zip(bucket, self._forward(features)):
+                scores[index] = score
+
+            # 统计填充比例：填充token数 / 批次总token数
+            padded_length = max(lengths[i] for i in bucket)
+            real_tokens = sum(lengths[i] for i in bucket)
+            total_tokens = padded_length * len(bucket)
+            buckets.append({
+                'size': len(bucket),
+                'padded_length': padded_length,
+                'padding_ratio': round(1 - real_tokens / total_tokens, 4) if total_tokens else 0.0
+            })
+
+        self.last_batch_stats = {
+            'text_count': count,
+            'bucket_count': len(buckets),
+            'buckets': buckets
+        }
+        logger.debug(f"分桶推理完成，输入数: {count}，分桶统计: {buckets}")
+
+        return scores
+
+    def _predict_cached(self, texts: List[str]) -> List[float]:
+        """
+        先逐条查询结果缓存，只把未命中的文本送入模型
+
+        同一批次内重复的文本只推理一次。
+
+        Args:
+            texts: 待分析的文本列表
+
+        Returns:
+            List[float]: 与输入顺序一致的情感分数列表
+        """
+        if not self.result_cache:
+            return self._infer_batch(texts)
+
+        scores: List[float] = [0.5] * len(texts)
+        # 缓存键 -> 需要回填的下标列表
+        pending = {}
+        for index, text in enumerate(texts):
+            cached = self.result_cache.get(text)
+            if cached is not None:
+                scores[index] = cached
+                continue
+            key = self.result_cache.make_key(text)
+            if key in pending:
+                pending[key].append(index)
+            else:
+                pending[key] = [index]
+
+        if pending:
+            miss_indices = [indices[0] for indices in pending.values()]
+            miss_scores = self._infer_batch([texts[i] for i in miss_indices])
+            for indices, score in zip(pending.values(), miss_scores):
+                self.result_cache.set(texts[indices[0]], score)
+                for index in indices:
+                    scores[index] = score
+
+        logger.debug(f"结果缓存查询完成，文本数: {len(texts)}，送入模型: {len(pending)}")
+        return scores
+
     def predict_single(self, text: str) -> float:
         """
         分析单个文本的情感分数
@@ -137,49 +587,9 @@ class Cemotion:
         if not self.model:
             raise Exception("情感分析模型未初始化")
         
-        # 保存当前工作目录
-        original_cwd = os.getcwd()
-        
         try:
-            # 如果有配置模型缓存目录，切换到该目录
-            if self.config and hasattr(self.config, 'MODEL_CACHE_DIR') and self.config.MODEL_CACHE_DIR:
-                model_cache_dir = self.config.MODEL_CACHE_DIR
-                if os.path.exists(model_cache_dir):
-                    os.chdir(model_cache_dir)
-            
-            result = self.model.predict(text)
-            
-            # 切换回原来的工作目录
-            os.chdir(original_cwd)
-            
-            # 确保返回值在合理范围内
-            score = 0.5
-            if isinstance(result, list) and len(result) > 0:
-                # 如果返回的是列表，取第一个元素
-                first_element = result[0]
-                if first_element is not None:
-                    if isinstance(first_element, (int, float)):
-                        score = float(first_element)
-                    else:
-                        try:
-                            score = float(str(first_element))
-                        except:
-                            score = 0.5
-            elif result is not None:
-                if isinstance(result, (int, float)):
-                    score = float(result)
-                else:
-                    try:
-                        score = float(str(result))
-                    except:
-                        score = 0.5
-            return max(0.0, min(1.0, score))
+            return self._predict_cached([text])[0]
         except Exception as e:
-            # 确保切换回原来的工作目录
-            try:
-                os.chdir(original_cwd)
-            except:
-                pass
             logger.error(f"情感分析失败: {e}")
             raise
 
@@ -196,52 +606,10 @@ class Cemotion:
         if not self.model:
             raise Exception("情感分析模型未初始化")
         
-        # 保存当前工作目录
-        original_cwd = os.getcwd()
-        
         try:
-            # 如果有配置模型缓存目录，切换到该目录
-            if self.config and hasattr(self.config, 'MODEL_CACHE_DIR') and self.config.MODEL_CACHE_DIR:
-                model_cache_dir = self.config.MODEL_CACHE_DIR
-                if os.path.exists(model_cache_dir):
-                    os.chdir(model_cache_dir)
-            
-            results = []
-            for text in texts:
-                result = self.model.predict(text)
-                # 确保返回值在合理范围内
-                score = 0.5
-                if isinstance(result, list) and len(result) > 0:
-                    # 如果返回的是列表，取第一个元素
-                    first_element = result[0]
-                    if first_element is not None:
-                        if isinstance(first_element, (int, float)):
-                            score = float(first_element)
-                        else:
-                            try:
-                                score = float(str(first_element))
-                            except:
-                                score = 0.5
-                elif result is not None:
-                    if isinstance(result, (int, float)):
-                        score = float(result)
-                    else:
-                        try:
-                            score = float(str(result))
-                        except:
-                            score = 0.5
-                results.append(max(0.0, min(1.0, score)))
-            
-            # 切换回原来的工作目录
-            os.chdir(original_cwd)
-            
-            return results
+            # 按长度分桶切分微批次，每个微批次只做一次前向传播
+            return self._predict_cached(texts)
         except Exception as e:
-            # 确保切换回原来的工作目录
-            try:
-                os.chdir(original_cwd)
-            except:
-                pass
             logger.error(f"批量情感分析失败: {e}")
             raise
     
@@ -272,13 +640,246 @@ class Cemotion:
             logger.error(f"情感分析失败 - 文本长度: {len(text)} 字符，耗时: {processing_time:.4f}秒, 错误: {str(e)}")
             raise
 
-    def analyze_long_text_emotion(self, text: str, max_chunk_size: int = 512) -> EmotionResult:
+    def _split_sentences(self, text: str) -> List[str]:
+        """按句末标点分句，过滤空句并去除首尾空格"""
+        sentences = split_sentences(text)
+        logger.info(f"分句完成，共{len(sentences)}句")
+        return sentences
+
+    def _build_units(self, text: str, sentences: List[str], document: Union[dict, None],
+                     window: int) -> List[Tuple[str, Union[List[int], None]]]:
+        """
+        将句子映射为模型输入单元
+
+        有整篇编码结果时，按字符偏移把每个句子对应到token区间，超过window个token的句子
+        按token切分，单元直接携带input_ids；否则按字符数切分，input_ids为None。
+
+        Args:
+            text: 原始文本
+            sentences: 分句结果（均为原文的子串）
+            document: encode_document的结果
+            window: 单元最大token数（不含特殊token）
+
+        Returns:
+            List[Tuple[str, Optional[List[int]]]]: (单元文本, input_ids) 列表
+        """
+        units = []
+        if document is None:
+            for sentence in sentences:
+                for i in range(0, len(sentence), window):
+                    units.append((sentence[i:i + window], None))
+            return units
+
+        input_ids = document['input_ids']
+        offsets = document['offsets']
+        token_starts = [start for start, _ in offsets]
+        position = 0
+        for sentence in sentences:
+            start = text.find(sentence, position)
+            if start < 0:
+                # 分句结果与原文对不上时退回逐句编码
+                units.append((sentence, None))
+                continue
+            end = start + len(sentence)
+            position = end
+
+            first = bisect.bisect_left(token_starts, start)
+            last = bisect.bisect_left(token_starts, end)
+            for chunk_start in range(first, last, window):
+                chunk_end = min(chunk_start + window, last)
+                chunk_text = text[offsets[chunk_start][0]:offsets[chunk_end - 1][1]]
+                units.append((chunk_text, input_ids[chunk_start:chunk_end]))
+        return units
+
+    def _score_units(self, units: List[Tuple[str, Union[List[int], None]]]) -> List[float]:
+        """
+        批量计算处理单元的情感分数
+
+        已编码的单元和只有文本的单元各走一次批量推理；批量推理失败时逐个重试，
+        仍然失败的单元使用中性分数0.5。配置了多进程推理池且单元数足够多时，
+        分发到子进程并行推理，子进程失败时退回当前进程。
+
+        Args:
+            units: _build_units返回的 (单元文本, input_ids) 列表
+
+        Returns:
+            List[float]: 与units顺序一致的分数列表
+        """
+        if self.process_pool is not None and self.process_pool.should_fan_out(len(units)):
+            try:
+                return self.process_pool.score_units(units)
+            except Exception as e:
+                logger.error(f"多进程推理失败，改为在当前进程推理: {e}")
+
+        scores = [0.5] * len(units)
+        encoded_indices = [i for i, (_, ids) in enumerate(units) if ids is not None]
+        text_indices = [i for i, (_, ids) in enumerate(units) if ids is None]
+
+        def score_group(indices, batch_fn):
+            if not indices:
+                return
+            try:
+                for index, score in zip(indices, batch_fn(indices)):
+                    scores[index] = score
+                return
+            except Exception as e:
+                logger.error(f"批量情感分析失败，改为逐句分析: {e}")
+            for index in indices:
+                try:
+                    scores[index] = batch_fn([index])[0]
+                except Exception as e:
+                    logger.error(f"句子{index+1}情感分析失败: {units[index][0][:50]}... 错误: {e}")
+
+        score_group(encoded_indices,
+                    lambda indices: self._infer_encoded(self._build_features([units[i][1] for i in indices])))
+        score_group(text_indices,
+                    lambda indices: self.predict_batch([units[i][0] for i in indices]))
+        return scores
+
+    @staticmethod
+    def _pack_units(units: List[Tuple[str, Union[List[int], None]]],
+                    window: int) -> Tuple[List[Tuple[str, Union[List[int], None]]], List[int]]:
+        """
+        按顺序贪心合并相邻的处理单元，使每个打包单元尽量填满token预算
+
+        只合并同类单元（都带input_ids或都只有文本，后者按字符数计）。
+
+        Args:
+            units: _build_units返回的 (单元文本, input_ids) 列表
+            window: 打包单元最大token数（不含特殊token）
+
+        Returns:
+            Tuple[list, List[int]]: (打包单元列表, 每个原单元所属的打包单元下标)
+        """
+        packs = []
+        owners = []
+        current_text, current_ids, current_size = None, None, 0
+        for text, ids in units:
+            size = len(ids) if ids is not None else len(text)
+            fits = (
+                current_text is not None
+                and (ids is None) == (current_ids is None)
+                and current_size + size <= window
+            )
+            if fits:
+                current_text += text
+                if ids is not None:
+                    current_ids = current_ids + list(ids)
+                current_size += size
+                packs[-1] = (current_text, current_ids)
+            else:
+                current_text = text
+                current_ids = list(ids) if ids is not None else None
+                current_size = size
+                packs.append((current_text, current_ids))
+            owners.append(len(packs) - 1)
+        return packs, owners
+
+    def _weighted_units(self, units: List[Tuple[str, Union[List[int], None]]], window: int,
+                        packing: bool) -> Tuple[list, List[int], List[int]]:
+        """
+        计算处理单元的聚合权重（首尾句权重为2，中间句为1），打包时权重按包内句子累加
+
+        Returns:
+            Tuple[list, List[int], List[int]]: (处理单元, 权重, 每个单元包含的句子数)
+        """
+        sentence_weights = [2 if (i == 0 or i == len(units) - 1) else 1 for i in range(len(units))]
+        if not packing:
+            return units, sentence_weights, [1] * len(units)
+
+        packs, owners = self._pack_units(units, window)
+        weights = [0] * len(packs)
+        sentence_counts = [0] * len(packs)
+        for owner, weight in zip(owners, sentence_weights):
+            weights[owner] += weight
+            sentence_counts[owner] += 1
+        return packs, weights, sentence_counts
+
+    def _approximate_score(self, units: List[Tuple[str, Union[List[int], None]]],
+                           weights: List[int]) -> Tuple[float, int, float, str]:
+        """
+        提前结束的近似加权聚合
+
+        先推理首尾单元（权重最高，分数确定），再对中间单元做不放回简单随机抽样（固定随机种子，
+        同一篇文本的结果可复现）。未推理的中间单元用已抽样中间单元的加权平均估计，每批推理后计算
+        最终分数的95%置信区间（含有限总体校正）。停止原因：
+        ci_threshold（半宽低于APPROXIMATE_CI_THRESHOLD）、polarity（整个区间已落在0.5同一侧，
+        情感极性已确定，但半宽可能仍高于阈值）、max_samples（达到APPROXIMATE_MAX_SAMPLES）、
+        exhausted（中间单元全部推理，结果精确）。
+
+        Args:
+            units: 处理单元
+            weights: 各单元的聚合权重
+
+        Returns:
+            Tuple[float, int, float, str]: (估计分数, 实际推理的单元数, 置信区间半宽, 停止原因)
+        """
+        threshold = getattr(self.config, 'APPROXIMATE_CI_THRESHOLD', 0.02) if self.config else 0.02
+        min_samples = getattr(self.config, 'APPROXIMATE_MIN_SAMPLES', 8) if self.config else 8
+        max_samples = getattr(self.config, 'APPROXIMATE_MAX_SAMPLES', 0) if self.config else 0
+        batch_size = max(1, getattr(self.config, 'BATCH_SIZE', 16)) if self.config else 16
+
+        count = len(units)
+        edges = sorted({0, count - 1})
+        middle = list(range(1, count - 1))
+        # 按固定顺序抽样会让置信区间有偏（例如总是先抽最长的句子），这里随机打乱抽样顺序
+        random.Random(0).shuffle(middle)
+        total_weight = sum(weights)
+        middle_weight = sum(weights[i] for i in middle)
+
+        scores = {}
+        for index, score in zip(edges, self._score_units([units[i] for i in edges])):
+            scores[index] = score
+        edge_sum = sum(scores[i] * weights[i] for i in edges)
+
+        estimate = edge_sum / sum(weights[i] for i in edges)
+        half_width = float('inf') if middle else 0.0
+        stop_reason = 'exhausted' if not middle else 'max_samples'
+        sampled = []
+        limit = len(middle) if max_samples <= 0 else min(len(middle), max_samples)
+        while len(sampled) < limit:
+            group = middle[len(sampled):min(len(sampled) + batch_size, limit)]
+            for index, score in zip(group, self._score_units([units[i] for i in group])):
+                scores[index] = score
+            sampled.extend(group)
+
+            # 已抽样中间单元的加权均值和方差
+            sampled_weight = sum(weights[i] for i in sampled)
+            middle_mean = sum(scores[i] * weights[i] for i in sampled) / sampled_weight
+            estimate = (edge_sum + middle_mean * middle_weight) / total_weight
+            if len(sampled) < 2 or len(sampled) == len(middle):
+                half_width = 0.0 if len(sampled) == len(middle) else float('inf')
+            else:
+                variance = sum(weights[i] * (scores[i] - middle_mean) ** 2 for i in sampled) / sampled_weight
+                correction = 1 - len(sampled) / len(middle)
+                standard_error = (variance / len(sampled) * correction) ** 0.5
+                half_width = 1.96 * standard_error * middle_weight / total_weight
+
+            if len(sampled) == len(middle):
+                stop_reason = 'exhausted'
+                break
+            if len(sampled) >= min_samples:
+                if half_width <= threshold:
+                    stop_reason = 'ci_threshold'
+                    break
+                if estimate - half_width > 0.5 or estimate + half_width < 0.5:
+                    stop_reason = 'polarity'
+                    break
+
+        estimate = max(0.0, min(1.0, estimate))
+        return estimate, len(edges) + len(sampled), half_width, stop_reason
+
+    def analyze_long_text_emotion(self, text: str, max_chunk_size: int = 512,
+                                  packing: bool = False, approximate: bool = False) -> EmotionResult:
         """
         分析长文本的情感分数（使用智能分段聚合）
         
         Args:
             text: 待分析的长文本
-            max_chunk_size: 最大分块大小，默认512字符
+            max_chunk_size: 单个处理单元的最大token数，默认512（同时受BATCH_MAX_LENGTH限制）
+            packing: 是否把相邻短句打包后再推理，打包内的句子共用同一个分数，
+                     减少前向传播次数但降低句子粒度
+            approximate: 是否启用提前结束的近似模式，聚合分数足够确定时不再推理剩余的中间句子
             
         Returns:
             EmotionResult: 情感分析结果
@@ -296,71 +897,83 @@ class Cemotion:
             text_length = len(text)
             logger.info(f"开始分析文本，长度: {text_length} 字符")
             
-            # 初始化最终分数
+            # 初始化最终分数和各阶段耗时
             final_score = 0.5
+            timings = {}
             
-            # 如果文本长度在模型限制内，直接使用单文本分析
-            if text_length <= max_chunk_size:
-                logger.info(f"文本长度{text_length}在限制内，直接分析")
+            # 整篇文本只分词一次，按token数（而不是字符数）判断是否需要分段
+            window = max(1, min(max_chunk_size, self.max_length - 2))
+            document = self.encode_document(text)
+            token_count = len(document['input_ids']) if document else text_length
+            
+            # 如果文本token数在模型限制内，直接使用单文本分析
+            if token_count <= window:
+                logger.info(f"文本共{token_count}个token，在限制内，直接分析")
+                inference_start = time.time()
                 final_score = self.predict_single(text)
+                timings['split_ms'] = round((inference_start - start_time) * 1000, 2)
+                timings['inference_ms'] = round((time.time() - inference_start) * 1000, 2)
+                timings['aggregation_ms'] = 0.0
+                timings['unit_count'] = 1
+                timings['sentences_scored'] = 1
                 logger.debug(f"短文本直接分析完成，分数: {final_score:.4f}")
             else:
-                logger.info(f"文本长度{text_length}超过限制，进行分段处理")
+                logger.info(f"文本共{token_count}个token，超过限制{window}，进行分段处理")
                 # 1. 按语义分句
-                try:
-                    sentences = split_sentence(text)
-                    # 过滤掉空字符串并去除首尾空格
-                    sentences = [s.strip() for s in sentences if s.strip()]
-                    logger.info(f"HanLP分句完成，共{len(sentences)}句")
-                except Exception as e:
-                    logger.error(f"HanLP分句失败: {e}")
-                    # 如果分句失败，使用简单分句方法
-                    import re
-                    sentences = re.split(r'[。！？；;!?]', text)
-                    sentences = [s.strip() for s in sentences if s.strip()]
-                    logger.info(f"正则表达式分句完成，共{len(sentences)}句")
+                sentences = self._split_sentences(text)
                 
-                # 2. 处理过长的句子
-                processed_sentences = []
-                for sentence in sentences:
-                    if len(sentence) <= max_chunk_size:
-                        processed_sentences.append(sentence)
-                    else:
-                        # 如果句子过长，按最大长度分割
-                        for i in range(0, len(sentence), max_chunk_size):
-                            processed_sentences.append(sentence[i:i+max_chunk_size])
-                
-                logger.info(f"分句处理完成，共{len(processed_sentences)}个处理单元")
+                # 2. 按token预算处理过长的句子
+                units = self._build_units(text, sentences, document, window)
+                logger.info(f"分句处理完成，共{len(units)}个处理单元")
                 
-                # 3. 对每句进行情感分析
-                sentence_scores = []
-                for i, sentence in enumerate(processed_sentences):
-                    try:
-                        score = self.predict_single(sentence)
-                        sentence_scores.append((sentence, score))
-                        logger.debug(f"句子{i+1}分析完成，长度:{len(sentence)}, 分数:{score:.4f}")
-                    except Exception as e:
-                        logger.error(f"句子{i+1}情感分析失败: {sentence[:50]}... 错误: {e}")
-                        # 如果分析失败，使用中性分数0.5
-                        sentence_scores.append((sentence, 0.5))
+                split_done = time.time()
+                timings['split_ms'] = round((split_done - start_time) * 1000, 2)
+                timings['unit_count'] = len(units)
                 
-                # 4. 加权聚合（首尾段加权、关键句优先）
-                if sentence_scores:
-                    # 简单的加权平均：首尾句子权重更高
-                    total_weight = 0
-                    weighted_sum = 0
-                    
-                    for i, (sentence, score) in enumerate(sentence_scores):
-                        # 计算权重：首尾句子权重为2，中间句子权重为1
-                        weight = 2 if (i == 0 or i == len(sentence_scores) - 1) else 1
-                        total_weight += weight
-                        weighted_sum += score * weight
-                        logger.debug(f"句子{i+1}权重:{weight}, 分数:{score:.4f}")
+                if approximate:
+                    # 近似模式：先推理首尾句，再随机抽样中间句，置信区间足够窄或极性已确定时提前结束
+                    units, weights, _ = self._weighted_units(units, window, packing)
+                    final_score, sentences_scored, half_width, stop_reason = self._approximate_score(units, weights)
+                    timings['inference_ms'] = round((time.time() - split_done) * 1000, 2)
+                    timings['aggregation_ms'] = 0.0
+                    timings['ci_half_width'] = round(half_width, 6)
+                    timings['stop_reason'] = stop_reason
+                    logger.info(f"近似模式完成，推理{sentences_scored}/{len(units)}个单元，停止原因:{stop_reason}, "
+                                f"置信区间半宽:{half_width:.4f}, 最终分数:{final_score:.4f}")
+                else:
+                    # 3. 所有处理单元一次性送入批量推理（复用整篇文本的分词结果，不再重复编码）
+                    if packing:
+                        packs, owners = self._pack_units(units, window)
+                        pack_scores = self._score_units(packs)
+                        scores = [pack_scores[owner] for owner in owners]
+                        sentences_scored = len(packs)
+                        logger.info(f"句子打包完成，{len(units)}个处理单元合并为{len(packs)}个")
+                    else:
+                        scores = self._score_units(units)
+                        sentences_scored = len(units)
+                    sentence_scores = list(zip([sentence for sentence, _ in units], scores))
+                    inference_done = time.time()
+                    timings['inference_ms'] = round((inference_done - split_done) * 1000, 2)
                     
-                    # 计算加权平均分数
-                    final_score = weighted_sum / total_weight if total_weight > 0 else 0.5
-                    final_score = max(0.0, min(1.0, final_score))
-                    logger.info(f"加权聚合完成，总权重:{total_weight}, 最终分数:{final_score:.4f}")
+                    # 4. 加权聚合（首尾段加权、关键句优先）
+                    if sentence_scores:
+                        # 简单的加权平均：首尾句子权重更高
+                        total_weight = 0
+                        weighted_sum = 0
+                        
+                        for i, (sentence, score) in enumerate(sentence_scores):
+                            # 计算权重：首尾句子权重为2，中间句子权重为1
+                            weight = 2 if (i == 0 or i == len(sentence_scores) - 1) else 1
+                            total_weight += weight
+                            weighted_sum += score * weight
+                            logger.debug(f"句子{i+1}权重:{weight}, 分数:{score:.4f}")
+                        
+                        # 计算加权平均分数
+                        final_score = weighted_sum / total_weight if total_weight > 0 else 0.5
+                        final_score = max(0.0, min(1.0, final_score))
+                        logger.info(f"加权聚合完成，总权重:{total_weight}, 最终分数:{final_score:.4f}")
+                    timings['aggregation_ms'] = round((time.time() - inference_done) * 1000, 2)
+                timings['sentences_scored'] = sentences_scored
             
             # 计算置信度（距离0.5的程度）
             confidence = abs(final_score - 0.5) * 2
@@ -370,10 +983,12 @@ class Cemotion:
                 emotion_score=final_score,
                 emotion=emotion,
                 confidence=round(confidence, 4),
-                text_length=text_length
+                text_length=text_length,
+                timings=timings
             )
 
             processing_time = time.time() - start_time
+            timings['total_ms'] = round(processing_time * 1000, 2)
             logger.info(f"长文本情感分析成功 - 文本长度: {text_length} 字符，耗时: {processing_time:.4f}秒")
 
             return result
@@ -386,6 +1001,71 @@ class Cemotion:
             logger.error(f"长文本情感分析失败 - 文本长度: {len(text)} 字符，耗时: {processing_time:.4f}秒, 错误: {str(e)}")
             raise EmotionAnalysisError(f"长文本情感分析失败: {str(e)}") from e
 
+    def iter_long_text_emotion(self, text: str, max_chunk_size: int = 512, packing: bool = False):
+        """
+        逐块分析长文本情感，边推理边产出结果（用于流式接口）
+
+        分句和分块方式与analyze_long_text_emotion一致，处理单元按BATCH_SIZE分组推理，
+        每组完成后立即产出该组的逐块结果和当前的加权聚合分数，最后产出汇总记录。
+
+        Args:
+            text: 待分析的长文本
+            max_chunk_size: 单个处理单元的最大token数
+            packing: 是否把相邻短句打包后再推理
+
+        Yields:
+            dict: type为chunk的逐块结果，最后一条为type为summary的汇总结果
+        """
+        start_time = time.time()
+        if not isinstance(text, str):
+            raise EmotionAnalysisError("输入的text必须是字符串类型")
+        if not text.strip():
+            raise EmotionAnalysisError("输入的文本不能为空")
+
+        window = max(1, min(max_chunk_size, self.max_length - 2))
+        document = self.encode_document(text)
+        token_count = len(document['input_ids']) if document else len(text)
+
+        # 每个待推理单元对应的原句数量和权重（首尾句权重为2，中间句为1）
+        if token_count <= window:
+            units = [(text, document['input_ids'] if document else None)]
+            weights = [1]
+            sentence_counts = [1]
+        else:
+            units = self._build_units(text, self._split_sentences(text), document, window)
+            units, weights, sentence_counts = self._weighted_units(units, window, packing)
+
+        batch_size = max(1, getattr(self.config, 'BATCH_SIZE', 16)) if self.config else 16
+        total_weight = 0
+        weighted_sum = 0.0
+        for start in range(0, len(units), batch_size):
+            group = units[start:start + batch_size]
+            for offset, score in enumerate(self._score_units(group)):
+                index = start + offset
+                total_weight += weights[index]
+                weighted_sum += score * weights[index]
+                yield {
+                    'type': 'chunk',
+                    'index': index,
+                    'text': group[offset][0],
+                    'sentence_count': sentence_counts[index],
+                    'score': score,
+                    'weight': weights[index],
+                    'aggregate_score': round(weighted_sum / total_weight, 6) if total_weight else 0.5
+                }
+
+        final_score = max(0.0, min(1.0, weighted_sum / total_weight)) if total_weight else 0.5
+        yield {
+            'type': 'summary',
+            'emotion_score': round(final_score, 6),
+            'emotion': "正面" if final_score >= 0.5 else "负面",
+            'confidence': round(abs(final_score - 0.5) * 2, 4),
+            'text_length': len(text),
+            'chunk_count': len(units),
+            'packing': packing,
+            'total_ms': round((time.time() - start_time) * 1000, 2)
+        }
+
     # 保持向后兼容性
     def predict(self, text):
         """保持与原接口的兼容性"""
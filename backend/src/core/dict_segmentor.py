@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+词典分词引擎
+基于前缀词典构建有向无环图（DAG），用动态规划求最大概率切分路径，作为HanLP之外的快速分词档位
+"""
+import os
+import re
+import math
+import time
+import logging
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger('SentiScore')
+
+# 汉字串走词典切分，其余部分按英文单词/数字和单个符号切分，空白直接丢弃
+HAN_BLOCK = re.compile(r'([一-鿿]+)')
+NON_HAN_TOKEN = re.compile(r'[A-Za-z0-9]+(?:[.\-_][A-Za-z0-9]+)*|\S')
+
+
+class DictSegmentor:
+    """
+    词典分词器
+
+    词典文件每行一个词：`词 词频 [词性]`（与jieba词典格式兼容），启动时整体读入内存，
+    每个进程各持有一份。所有词及其前缀保存在同一个哈希表中（前缀词频为0），等价于一棵前缀树，
+    查找句子中以某个位置开头的全部词只需逐字扩展前缀。
+    """
+
+    def __init__(self, frequencies: Dict[str, int], total: int, source: str = ''):
+        """
+        Args:
+            frequencies: 词及前缀 -> 词频（前缀为0）
+            total: 全部词的词频之和
+            source: 词典来源路径
+        """
+        self.frequencies = frequencies
+        self.total = max(1, total)
+        self.log_total = math.log(self.total)
+        self.source = source
+        self.word_count = sum(1 for freq in frequencies.values() if freq)
+
+    @classmethod
+    def load(cls, path: str) -> 'DictSegmentor':
+        """
+        从词典文件加载
+
+        Args:
+            path: 词典文件路径（UTF-8）
+
+        Returns:
+            DictSegmentor: 词典分词器
+        """
+        start_time = time.time()
+        frequencies: Dict[str, int] = {}
+        total = 0
+        with open(path, 'r', encoding='utf-8') as f:
+            for line_number, raw in enumerate(f, 1):
+                line = raw.strip()
+                if not line or line.startswith('#'):
+                    continue
+                parts = line.split()
+                word = parts[0]
+                try:
+                    freq = int(parts[1]) if len(parts) > 1 else 1
+                except ValueError:
+                    logger.warning(f"词典第{line_number}行词频无效，已跳过: {line}")
+                    continue
+                frequencies[word] = frequencies.get(word, 0) + freq
+                total += freq
+                for end in range(1, len(word)):
+                    frequencies.setdefault(word[:end], 0)
+
+        segmentor = cls(frequencies, total, source=os.path.abspath(path))
+        logger.info(f"词典分词引擎加载完成: {path}，词数: {segmentor.word_count}，"
+                    f"耗时: {time.time() - start_time:.2f}秒")
+        return segmentor
+
+    def _build_dag(self, sentence: str) -> List[List[int]]:
+        """构建DAG：dag[i]为以位置i开头的所有词的结束位置（含），没有词时只包含i本身"""
+        frequencies = self.frequencies
+        length = len(sentence)
+        dag = []
+        for start in range(length):
+            ends = []
+            end = start
+            fragment = sentence[start]
+            while fragment in frequencies:
+                if frequencies[fragment]:
+                    ends.append(end)
+                end += 1
+                if end >= length:
+                    break
+                fragment = sentence[start:end + 1]
+            dag.append(ends or [start])
+        return dag
+
+    def _best_route(self, sentence: str, dag: List[List[int]]) -> List[Tuple[float, int]]:
+        """从后向前动态规划，route[i]为从位置i到句尾的最大对数概率及第一个词的结束位置"""
+        frequencies = self.frequencies
+        log_total = self.log_total
+        length = len(sentence)
+        route: List[Tuple[float, int]] = [(0.0, 0)] * (length + 1)
+        for start in range(length - 1, -1, -1):
+            route[start] = max(
+                (math.log(frequencies.get(sentence[start:end + 1]) or 1) - log_total + route[end + 1][0], end)
+                for end in dag[start]
+            )
+        return route
+
+    def _cut_han(self, sentence: str) -> List[str]:
+        """对连续汉字串做最大概率切分"""
+        route = self._best_route(sentence, self._build_dag(sentence))
+        words = []
+        start = 0
+        while start < len(sentence):
+            end = route[start][1] + 1
+            words.append(sentence[start:end])
+            start = end
+        return words
+
+    def segment(self, text: str) -> List[str]:
+        """
+        对文本分词
+
+        Args:
+            text: 待分词的文本
+
+        Returns:
+            List[str]: 分词结果
+        """
+        words = []
+        for block in HAN_BLOCK.split(text):
+            if not block:
+                continue
+            if HAN_BLOCK.fullmatch(block):
+                words.extend(self._cut_han(block))
+            else:
+                words.extend(NON_HAN_TOKEN.findall(block))
+        return words
+
+    def stats(self) -> dict:
+        """获取词典信息"""
+        return {
+            'source': self.source,
+            'word_count': self.word_count,
+            'total_frequency': self.total
+        }
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+ONNX Runtime推理后端
+将cemotion 2.0的PyTorch权重导出为ONNX模型，并通过ONNX Runtime执行推理
+"""
+import os
+import logging
+from typing import Optional
+import numpy as np
+import torch
+
+# onnxruntime为可选依赖，未安装时ONNX后端不可用
+try:
+    import onnxruntime
+except ImportError:
+    onnxruntime = None
+
+logger = logging.getLogger('SentiScore')
+
+INPUT_NAMES = ['input_ids', 'attention_mask', 'token_type_ids']
+
+
+def is_available() -> bool:
+    """检查onnxruntime是否可用"""
+    return onnxruntime is not None
+
+
+def export_onnx_model(model: torch.nn.Module, onnx_path: str, device, opset_version: int = 14):
+    """
+    将情感分类模型导出为ONNX格式
+
+    批次大小和序列长度均为动态维度。先写入临时文件再重命名，避免导出中断留下损坏的模型。
+
+    Args:
+        model: SentimentClassifier实例
+        onnx_path: 导出路径
+        device: 模型所在设备
+        opset_version: ONNX算子集版本
+    """
+    directory = os.path.dirname(onnx_path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory, exist_ok=True)
+
+    dummy = torch.ones((1, 8), dtype=torch.long, device=device)
+    dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in INPUT_NAMES}
+    dynamic_axes['logits'] = {0: 'batch'}
+
+    temp_path = onnx_path + '.exporting'
+    # 导出后保持推理模式，不恢复训练标志（SentimentClassifier默认处于训练模式，恢复会重新打开dropout）
+    model.eval()
+    try:
+        with torch.no_grad():
+            torch.onnx.export(
+                model,
+                (dummy, dummy, torch.zeros_like(dummy)),
+                temp_path,
+                input_names=INPUT_NAMES,
+                output_names=['logits'],
+                dynamic_axes=dynamic_axes,
+                opset_version=opset_version
+            )
+        os.replace(temp_path, onnx_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    logger.info(f"ONNX模型导出完成: {onnx_path}")
+
+
+class OnnxSentimentSession:
+    """ONNX Runtime推理会话封装"""
+
+    def __init__(self, onnx_path: str, intra_op_threads: Optional[int] = None):
+        """
+        创建推理会话（启用全部图优化，仅使用CPU执行器）
+
+        Args:
+            onnx_path: ONNX模型路径
+            intra_op_threads: 算子内并行线程数，None表示使用onnxruntime默认值
+        """
+        if onnxruntime is None:
+            raise ImportError("未安装onnxruntime，无法使用ONNX推理后端")
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+
+        self.onnx_path = onnx_path
+        self.session = onnxruntime.InferenceSession(
+            onnx_path, options, providers=['CPUExecutionProvider']
+        )
+
+    def run(self, input_ids: np.ndarray, attention_mask: np.ndarray, token_type_ids: np.ndarray) -> np.ndarray:
+        """
+        执行推理
+
+        Returns:
+            np.ndarray: 形状为(batch,)的logits
+        """
+        outputs = self.session.run(['logits'], {
+            'input_ids': input_ids.astype(np.int64),
+            'attention_mask': attention_mask.astype(np.int64),
+            'token_type_ids': token_type_ids.astype(np.int64)
+        })
+        return outputs[0].reshape(-1)
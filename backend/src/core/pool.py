@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+多进程推理池
+把一篇超长文档的处理单元分发给多个持有模型的子进程并行处理，按原顺序合并结果
+"""
+import sys
+import time
+import logging
+import threading
+import contextlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List, Optional, Tuple, Union
+
+logger = logging.getLogger('SentiScore')
+
+# 子进程内的模型实例（每个子进程各自加载一次）
+_worker_analyzer = None
+_worker_segmentor = None
+
+
+def _init_worker(load_sentiment: bool, load_segment: bool):
+    """子进程初始化：加载所需的模型"""
+    global _worker_analyzer, _worker_segmentor
+    from config import config
+
+    if load_sentiment:
+        from src.core.cemotion import Cemotion
+        _worker_analyzer = Cemotion(config=config)
+    if load_segment:
+        from src.core.segmentor import TextSegmentor
+        _worker_segmentor = TextSegmentor(config=config)
+    logger.info(f"推理池子进程已就绪，情感分析模型: {load_sentiment}，分词模型: {load_segment}")
+
+
+def _score_units_task(units: List[Tuple[str, Union[List[int], None]]]) -> List[float]:
+    """子进程任务：计算一组处理单元的情感分数"""
+    if _worker_analyzer is None:
+        raise RuntimeError("推理池子进程未加载情感分析模型")
+    return _worker_analyzer._score_units(units)
+
+
+def _segment_chunks_task(chunks: List[str]) -> List[List[str]]:
+    """子进程任务：对一组文本块分词"""
+    if _worker_segmentor is None:
+        raise RuntimeError("推理池子进程未加载分词模型")
+    return _worker_segmentor._segment_chunks(chunks)
+
+
+def _ready() -> bool:
+    """子进程任务：确认初始化完成"""
+    return True
+
+
+@contextlib.contextmanager
+def _without_main_reimport():
+    """
+    启动子进程期间隐藏主模块路径
+
+    spawn方式启动的子进程默认会以__mp_main__的名义重新执行主脚本（python app.py），
+    这会在每个子进程里重复初始化整个Web应用和模型。子进程只需要本模块中的任务函数，
+    因此启动期间临时移除主模块的__file__，让子进程跳过主脚本。
+    """
+    main_module = sys.modules.get('__main__')
+    main_file = getattr(main_module, '__file__', None)
+    if main_file is not None and getattr(main_module, '__spec__', None) is None:
+        del main_module.__file__
+        try:
+            yield
+        finally:
+            main_module.__file__ = main_file
+    else:
+        yield
+
+
+def _split_evenly(items: list, parts: int) -> List[list]:
+    """按顺序把列表切成最多parts段，各段长度相差不超过1"""
+    parts = max(1, min(parts, len(items)))
+    size, remainder = divmod(len(items), parts)
+    slices = []
+    start = 0
+    for i in range(parts):
+        end = start + size + (1 if i < remainder else 0)
+        slices.append(items[start:end])
+        start = end
+    return slices
+
+
+class InferencePool:
+    """
+    持有模型副本的子进程池
+
+    子进程使用spawn方式启动，在初始化时各自加载模型，父进程只负责分句、分块和结果合并，
+    不额外加载模型副本。一篇文档的处理单元按顺序切成与进程数相同的段，
+    各段并行处理后按原顺序拼接。
+    """
+
+    def __init__(self, max_workers: int = 4, load_sentiment: bool = True, load_segment: bool = True,
+                 min_items: int = 64, timeout: Optional[float] = None):
+        """
+        初始化推理池
+
+        Args:
+            max_workers: 子进程数
+            load_sentiment: 子进程是否加载情感分析模型
+            load_segment: 子进程是否加载分词模型
+            min_items: 处理单元数不少于该值时才分发到子进程，较少时进程间通信开销大于收益
+            timeout: 等待子进程结果的超时时间（秒），None表示不限制
+        """
+        self.max_workers = max(1, int(max_workers))
+        self.load_sentiment = load_sentiment
+        self.load_segment = load_segment
+        self.min_items = max(1, int(min_items))
+        self.timeout = timeout
+
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(load_sentiment, load_segment)
+        )
+        # 立即启动全部子进程并等待模型加载完成，避免首个长文档请求承担加载耗时
+        with _without_main_reimport():
+            futures = [self._executor.submit(_ready) for _ in range(self.max_workers)]
+        for future in futures:
+            future.result()
+
+        self._lock = threading.Lock()
+        self._jobs = 0
+        self._failed_jobs = 0
+        self._items = 0
+        logger.info(f"多进程推理池已启动，子进程数: {self.max_workers}，最少分发单元数: {self.min_items}")
+
+    def should_fan_out(self, count: int) -> bool:
+        """处理单元数是否值得分发到子进程"""
+        return count >= self.min_items
+
+    def _map_ordered(self, task: Callable, items: list) -> list:
+        """把items按顺序分段提交给子进程，按原顺序拼接结果"""
+        start_time = time.time()
+        futures = [self._executor.submit(task, part) for part in _split_evenly(items, self.max_workers)]
+        try:
+            results = []
+            for future in futures:
+                results.extend(future.result(timeout=self.timeout))
+        except Exception:
+            for future in futures:
+                future.cancel()
+            with self._lock:
+                self._failed_jobs += 1
+            raise
+
+        with self._lock:
+            self._jobs += 1
+            self._items += len(items)
+        logger.debug(f"多进程处理完成，单元数: {len(items)}，分段数: {len(futures)}，"
+                     f"耗时: {time.time() - start_time:.4f}秒")
+        return results
+
+    def score_units(self, units: List[Tuple[str, Union[List[int], None]]]) -> List[float]:
+        """
+        并行计算处理单元的情感分数
+
+        Args:
+            units: (单元文本, input_ids) 列表
+
+        Returns:
+            List[float]: 与units顺序一致的分数列表
+        """
+        if not self.load_sentiment:
+            raise RuntimeError("推理池未加载情感分析模型")
+        return self._map_ordered(_score_units_task, units)
+
+    def segment_chunks(self, chunks: List[str]) -> List[List[str]]:
+        """
+        并行对文本块分词
+
+        Args:
+            chunks: 文本块列表
+
+        Returns:
+            List[List[str]]: 与chunks顺序一致的分词结果
+        """
+        if not self.load_segment:
+            raise RuntimeError("推理池未加载分词模型")
+        return self._map_ordered(_segment_chunks_task, chunks)
+
+    def stats(self) -> dict:
+        """获取推理池统计"""
+        with self._lock:
+            return {
+                'max_workers': self.max_workers,
+                'min_items': self.min_items,
+                'sentiment': self.load_sentiment,
+                'segment': self.load_segment,
+                'jobs': self._jobs,
+                'failed_jobs': self._failed_jobs,
+                'items': self._items
+            }
+
+    def shutdown(self, wait: bool = True):
+        """关闭子进程池"""
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+        logger.info("多进程推理池已关闭")
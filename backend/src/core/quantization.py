@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+模型量化模块
+对情感分类模型的线性层做动态int8量化，并评估量化前后的分数漂移
+"""
+import io
+import logging
+from typing import List
+import torch
+
+logger = logging.getLogger('SentiScore')
+
+# 固定评估集：覆盖正面、负面、中性以及长短不一的文本
+EVALUATION_TEXTS = [
+    "这个产品非常好，我很喜欢",
+    "服务态度很差，非常失望",
+    "今天天气不错",
+    "一般般吧，没什么特别的",
+    "物流很快，包装也很精美，下次还会再来",
+    "质量太差了，用了两天就坏了，要求退货",
+    "价格便宜，性价比很高",
+    "客服一直不回消息，体验极差",
+    "电影剧情紧凑，演员演技在线，值得一看",
+    "等了一个多小时才上菜，味道也很一般",
+    "还行",
+    "不推荐购买",
+    "超出预期！",
+    "屏幕显示效果清晰，但是电池续航有点短",
+    "酒店位置方便，房间干净，前台服务热情周到",
+    "说明书写得不清楚，安装花了很长时间，很不满意",
+]
+
+
+def quantize_dynamic_int8(model: torch.nn.Module) -> torch.nn.Module:
+    """
+    对模型中的全部线性层做动态int8量化（仅支持CPU推理）
+
+    Args:
+        model: 浮点模型
+
+    Returns:
+        torch.nn.Module: 量化后的模型
+    """
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def state_dict_size_mb(model: torch.nn.Module) -> float:
+    """计算模型参数序列化后的大小（MB）"""
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return round(buffer.tell() / (1024 * 1024), 2)
+
+
+def drift_report(texts: List[str], reference_scores: List[float], quantized_scores: List[float]) -> dict:
+    """
+    生成量化前后的分数漂移报告
+
+    Args:
+        texts: 评估文本
+        reference_scores: 浮点模型的分数
+        quantized_scores: 量化模型的分数
+
+    Returns:
+        dict: 平均/最大绝对漂移、极性翻转数量以及逐条明细
+    """
+    items = []
+    flipped = 0
+    for text, reference, quantized in zip(texts, reference_scores, quantized_scores):
+        drift = abs(reference - quantized)
+        is_flipped = (reference >= 0.5) != (quantized >= 0.5)
+        if is_flipped:
+            flipped += 1
+        items.append({
+            'text': text,
+            'fp32_score': reference,
+            'int8_score': quantized,
+            'drift': round(drift, 6),
+            'flipped': is_flipped
+        })
+
+    drifts = [item['drift'] for item in items]
+    return {
+        'text_count': len(items),
+        'mean_abs_drift': round(sum(drifts) / len(drifts), 6) if drifts else 0.0,
+        'max_abs_drift': max(drifts) if drifts else 0.0,
+        'flipped_count': flipped,
+        'items': items
+    }
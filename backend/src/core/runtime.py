@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+推理运行时配置模块
+统一设置PyTorch线程数、CPU亲和性以及推理执行上下文
+"""
+import os
+import logging
+from typing import List, Optional
+import torch
+
+logger = logging.getLogger('SentiScore')
+
+
+def parse_cpu_list(value: str) -> List[int]:
+    """
+    解析CPU列表字符串，例如 "0-3,6" -> [0, 1, 2, 3, 6]
+
+    Args:
+        value: CPU列表字符串
+
+    Returns:
+        List[int]: CPU编号列表
+    """
+    cpus = set()
+    for part in value.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            start, end = part.split('-', 1)
+            cpus.update(range(int(start), int(end) + 1))
+        else:
+            cpus.add(int(part))
+    return sorted(cpus)
+
+
+def available_cpu_count() -> int:
+    """当前进程可用的CPU数量（考虑CPU亲和性）"""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def configure_inference_runtime(config) -> dict:
+    """
+    按配置设置推理线程和CPU亲和性
+
+    算子内线程数默认取 可用CPU数 / 同一主机上的推理进程数：只有一个进程时使用全部CPU；
+    启用多进程推理池（MAX_WORKERS个子进程）或配置了多个服务进程（SERVER_WORKERS）时均分CPU，
+    避免多个进程各自按核心数开线程造成超额订阅。算子间线程只能在首次并行计算前设置，已设置过时保持原值。
+
+    Args:
+        config: 配置对象
+
+    Returns:
+        dict: 实际生效的运行时配置
+    """
+    info = {
+        'inference_mode': bool(getattr(config, 'INFERENCE_MODE_ENABLED', True)),
+        'cpu_affinity': None
+    }
+
+    # CPU亲和性
+    affinity = getattr(config, 'INFERENCE_CPU_AFFINITY', '')
+    if affinity:
+        if hasattr(os, 'sched_setaffinity'):
+            try:
+                cpus = parse_cpu_list(affinity)
+                os.sched_setaffinity(0, cpus)
+                info['cpu_affinity'] = cpus
+            except (ValueError, OSError) as e:
+                logger.warning(f"设置CPU亲和性失败: {e}")
+        else:
+            logger.warning("当前平台不支持设置CPU亲和性")
+
+    # 算子内线程数
+    intra_op_threads: Optional[int] = getattr(config, 'INFERENCE_INTRA_OP_THREADS', 0)
+    if not intra_op_threads:
+        processes = max(1, getattr(config, 'SERVER_WORKERS', 1))
+        if getattr(config, 'PROCESS_POOL_ENABLED', False):
+            processes *= max(1, getattr(config, 'MAX_WORKERS', 1))
+        intra_op_threads = max(1, available_cpu_count() // processes)
+    torch.set_num_threads(intra_op_threads)
+
+    # 算子间线程数
+    inter_op_threads = getattr(config, 'INFERENCE_INTER_OP_THREADS', 1)
+    if inter_op_threads:
+        try:
+            torch.set_num_interop_threads(inter_op_threads)
+        except RuntimeError as e:
+            logger.warning(f"算子间线程数已初始化，无法修改: {e}")
+
+    info['intra_op_threads'] = torch.get_num_threads()
+    info['inter_op_threads'] = torch.get_num_interop_threads()
+    logger.info(f"推理运行时配置完成: {info}")
+    return info
+
+
+def inference_context(enabled: bool = True):
+    """
+    推理执行上下文
+
+    启用时使用 torch.inference_mode()，关闭版本计数和自动求导记录；否则退化为 torch.no_grad()。
+    """
+    if enabled:
+        return torch.inference_mode()
+    return torch.no_grad()
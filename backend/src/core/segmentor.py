@@ -23,22 +23,69 @@ except ImportError:
     # 在开发环境中，模块路径是 backend.src.utils.helpers
     from backend.src.utils.helpers import APIError
 
+from src.core.cache import ResultCache, create_shared_store
+from src.utils.sentence_splitter import split_sentences
+from src.core.dict_segmentor import DictSegmentor
+
 logger = logging.getLogger('SentiScore')
 
 
 class TextSegmentor:
     """文本分词器类，基于HanLP的实现"""
     
+    # HanLP分词模型标识，同时作为缓存键中的模型版本
+    MODEL_NAME = 'COARSE_ELECTRA_SMALL_ZH'
+    # 可选的分词引擎：neural为HanLP神经网络模型，dict为词典最大概率分词
+    ENGINES = ('neural', 'dict')
+
     def __init__(self, config=None):
         """初始化HanLP分词器"""
         try:
             # 为避免静态类型检查工具报错，使用字符串方式加载模型
             # COARSE_ELECTRA_SMALL_ZH 是 hanlp.pretrained.tok.COARSE_ELECTRA_SMALL_ZH 的字符串标识符
-            self.hanlp: Any = hanlp.load('COARSE_ELECTRA_SMALL_ZH')
+            self.hanlp: Any = hanlp.load(self.MODEL_NAME)
             logger.info("HanLP分词器初始化成功")
         except Exception as e:
             logger.error(f"HanLP分词器初始化失败: {e}", exc_info=True)
             raise
+        
+        # 分词结果缓存：整段文本的LRU（可回退到跨worker共享存储），以及长文本内部的句子级缓存
+        self.result_cache = None
+        self.sentence_cache = None
+        if config and getattr(config, 'RESULT_CACHE_ENABLED', False):
+            self.result_cache = ResultCache(
+                max_size=getattr(config, 'SEGMENT_CACHE_SIZE', 1000),
+                namespace='segment',
+                version=self.MODEL_NAME,
+                shared=create_shared_store(config)
+            )
+            sentence_cache_size = getattr(config, 'SEGMENT_SENTENCE_CACHE_SIZE', 10000)
+            if sentence_cache_size > 0:
+                # 句子级缓存只保存在进程内，避免长文档的每个句子都写入共享存储
+                self.sentence_cache = ResultCache(
+                    max_size=sentence_cache_size,
+                    namespace='segment_sentence',
+                    version=self.MODEL_NAME
+                )
+            logger.info(f"分词结果缓存已启用，容量: {self.result_cache.max_size}，"
+                        f"句子级缓存容量: {sentence_cache_size}")
+        # 可选的多进程推理池（由应用在初始化后设置）
+        self.process_pool = None
+        # 单次送入HanLP的最大文本数
+        self.batch_size = max(1, getattr(config, 'SEGMENT_BATCH_SIZE', 32)) if config else 32
+        # 长文本分块时块边界两侧的上下文字符数（0表示不重叠）
+        self.chunk_overlap = max(0, getattr(config, 'SEGMENT_CHUNK_OVERLAP', 0)) if config else 0
+        
+        # 可选的词典分词引擎（快速档位），以及默认使用词典引擎的套餐
+        self.dict_engine = None
+        dict_plans = getattr(config, 'SEGMENT_DICT_PLANS', '') if config else ''
+        self.dict_plans = {name.strip() for name in dict_plans.split(',') if name.strip()}
+        dict_path = getattr(config, 'SEGMENT_DICT_PATH', '') if config else ''
+        if dict_path:
+            try:
+                self.dict_engine = DictSegmentor.load(dict_path)
+            except Exception as e:
+                logger.error(f"词典分词引擎加载失败，仅使用HanLP: {e}")
     
     def validate_input(self, text: str) -> Tuple[bool, Optional[APIError]]:
         """验证输入参数"""
@@ -95,16 +142,49 @@ class TextSegmentor:
 
         return True, None
 
-    def segment_single(self, text: str) -> List[str]:
+    def resolve_engine(self, engine: Optional[str] = None) -> str:
+        """
+        确定实际使用的分词引擎
+
+        未指定或词典引擎未加载时使用neural。
+
+        Raises:
+            ValueError: 引擎名称无效
+        """
+        if engine is None:
+            return 'neural'
+        if engine not in self.ENGINES:
+            raise ValueError(f"不支持的分词引擎: {engine}，可选值: {', '.join(self.ENGINES)}")
+        if engine == 'dict' and self.dict_engine is None:
+            logger.warning("词典分词引擎未启用，改用HanLP分词")
+            return 'neural'
+        return engine
+
+    def segment_single(self, text: str, engine: Optional[str] = None) -> List[str]:
         """对单个文本进行分词"""
+        # 引擎名称无效时直接抛出ValueError，不走降级分词
+        engine = self.resolve_engine(engine)
         try:
             # 空文本处理
             if not text.strip():
                 return []
             
+            # 词典引擎无需缓存，直接分词
+            if engine == 'dict':
+                return self.dict_engine.segment(text)
+            
+            # 查询结果缓存
+            if self.result_cache is not None:
+                cached = self.result_cache.get(text)
+                if cached is not None:
+                    return cached
+            
             # 使用HanLP进行分词
             result = self.hanlp(text)
             if result is not None:
+                result = list(result)
+                if self.result_cache is not None:
+                    self.result_cache.set(text, result)
                 return result
             else:
                 return []
@@ -113,56 +193,253 @@ class TextSegmentor:
             # 降级方案：使用简单分词
             return self._fallback_segment(text)
     
-    def segment_batch(self, texts: List[str]) -> List[List[str]]:
-        """对多个文本进行批量分词"""
+    def segment_batch(self, texts: List[str], engine: Optional[str] = None) -> List[List[str]]:
+        """
+        对多个文本进行批量分词
+
+        先查询结果缓存，未命中的文本按长度分桶后整批送入HanLP，同一批次内重复的文本只分词一次。
+        """
+        if self.resolve_engine(engine) == 'dict':
+            return [self.dict_engine.segment(text) if text.strip() else [] for text in texts]
         try:
-            results = []
-            for text in texts:
-                # 对每个文本执行分词
-                result = self.segment_single(text)
-                results.append(result)
-            return results
+            return self._segment_cached(texts, self.result_cache, self._tokenize_batch)
         except Exception as e:
             logger.error(f"批量文本分词过程中出错: {e}")
             raise
 
-    def segment_long_text(self, text: str, max_len: int = 10000) -> List[str]:
-        """对长文本进行智能分块分词处理"""
+    def _segment_cached(self, texts: List[str], cache: Optional[ResultCache], tokenize) -> List[List[str]]:
+        """
+        带缓存的批量分词
+
+        Args:
+            texts: 文本列表
+            cache: 结果缓存，None表示不使用缓存
+            tokenize: 对未命中文本批量分词的函数，结果为None的文本使用后备分词
+
+        Returns:
+            List[List[str]]: 与输入顺序一致的分词结果
+        """
+        results: List[List[str]] = [[] for _ in texts]
+        # 缓存键（或不使用缓存时的文本本身） -> 需要回填的下标列表
+        pending = {}
+        for index, text in enumerate(texts):
+            # 空文本处理
+            if not text.strip():
+                continue
+            if cache is None:
+                pending.setdefault(text, []).append(index)
+                continue
+            cached = cache.get(text)
+            if cached is not None:
+                results[index] = cached
+                continue
+            pending.setdefault(cache.make_key(text), []).append(index)
+        
+        if pending:
+            miss_texts = [texts[indices[0]] for indices in pending.values()]
+            for indices, segments in zip(pending.values(), tokenize(miss_texts)):
+                if segments is None:
+                    segments = self._fallback_segment(texts[indices[0]])
+                elif cache is not None:
+                    cache.set(texts[indices[0]], segments)
+                for index in indices:
+                    results[index] = segments
+        
+        logger.debug(f"批量分词完成，文本数: {len(texts)}，送入HanLP: {len(pending)}")
+        return results
+
+    def _tokenize_batch(self, texts: List[str]) -> List[Optional[List[str]]]:
+        """
+        按长度分桶批量调用HanLP
+
+        每个分桶最多batch_size条文本；某个分桶整体失败时逐条重试，仍然失败的文本结果为None，
+        由调用方执行后备分词。
+
+        Args:
+            texts: 非空文本列表
+
+        Returns:
+            List[Optional[List[str]]]: 与输入顺序一致的分词结果
+        """
+        results: List[Optional[List[str]]] = [None] * len(texts)
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        for start in range(0, len(order), self.batch_size):
+            bucket = order[start:start + self.batch_size]
+            try:
+                outputs = self.hanlp([texts[i] for i in bucket])
+                if outputs is None or len(outputs) != len(bucket):
+                    raise ValueError("HanLP批量分词结果数量与输入不一致")
+                for index, output in zip(bucket, outputs):
+                    results[index] = list(output) if output is not None else None
+                continue
+            except Exception as e:
+                logger.error(f"HanLP批量分词失败，改为逐条分词: {e}")
+            
+            for index in bucket:
+                try:
+                    output = self.hanlp(texts[index])
+                    results[index] = list(output) if output is not None else None
+                except Exception as e:
+                    logger.error(f"文本分词过程中出错: {e}")
+        return results
+
+    def segment_long_text(self, text: str, max_len: int = 10000, overlap: Optional[int] = None) -> List[str]:
+        """
+        对长文本进行智能分块分词处理
+
+        启用句子级缓存时，不超过max_len的句子逐句查询缓存，只有未见过的句子送入HanLP，
+        多篇文档共有的段落（免责声明、签名等）只分词一次；句子边界本身就是词边界，这些句子不需要overlap。
+        超过max_len的句子不缓存，按max_len切块后与未启用缓存时一样处理。
+        未启用时所有文本块整批送入HanLP。overlap大于0时，每个文本块两侧各带上overlap个字符的上下文一起分词，
+        再按字符位置在接缝处对齐，避免块边界把一个词切开。
+
+        Args:
+            text: 待分词的长文本
+            max_len: 文本块最大字符数
+            overlap: 块边界两侧的上下文字符数，None表示使用SEGMENT_CHUNK_OVERLAP配置
+        """
         try:
+            if overlap is None:
+                overlap = self.chunk_overlap
+            overlap = max(0, int(overlap))
+            
             # 智能分块策略（按句子边界切分）
             sentences = self._split_into_sentences(text)
-            chunks = self._create_chunks(sentences, max_len)
+            if self.sentence_cache is None:
+                chunks = self._create_chunks(sentences, max_len)
+                # 各文本块在原文中的[起始, 结束)位置（分块结果拼接后与原文一致）
+                bounds = []
+                position = 0
+                for chunk in chunks:
+                    bounds.append((position, position + len(chunk)))
+                    position += len(chunk)
+                return self._segment_spans(text, bounds, overlap, 0, len(text))
             
+            short_results = iter(self._segment_cached(
+                [sentence for sentence in sentences if len(sentence) <= max_len],
+                self.sentence_cache, self._segment_pieces
+            ))
             results = []
-            for chunk in chunks:
-                try:
-                    # 使用HanLP进行分词
-                    result = self.hanlp(chunk)
-                    if result is not None:
-                        results.extend(result)
-                    else:
-                        results.extend(self._fallback_segment(chunk))
-                except Exception as e:
-                    logger.error(f"分块处理失败: {e}")
-                    results.extend(self._fallback_segment(chunk))
-            
+            position = 0
+            for sentence in sentences:
+                end = position + len(sentence)
+                if len(sentence) <= max_len:
+                    results.extend(next(short_results))
+                else:
+                    # 超长句子按max_len切块，上下文不越过句子边界，结果与前后句子不重叠
+                    bounds = [(start, min(end, start + max_len)) for start in range(position, end, max_len)]
+                    results.extend(self._segment_spans(text, bounds, overlap, position, end))
+                position = end
             return results
         except Exception as e:
             logger.error(f"长文本处理失败: {e}")
             return self._fallback_segment(text)
+    
+    def _segment_spans(self, text: str, bounds: List[Tuple[int, int]], overlap: int,
+                       lower: int, upper: int) -> List[str]:
+        """对text中的各[起始, 结束)区间分词，overlap大于0时带上不超出[lower, upper)的上下文并在接缝处对齐"""
+        if overlap and len(bounds) > 1:
+            windows = [(max(lower, start - overlap), min(upper, end + overlap)) for start, end in bounds]
+        else:
+            windows = bounds
+        chunk_results = self._segment_pieces([text[start:end] for start, end in windows])
+        
+        if windows is not bounds:
+            return self._reconcile_overlaps(text, bounds, windows, chunk_results)
+        
+        results = []
+        for segments in chunk_results:
+            results.extend(segments)
+        return results
+    
+    def _segment_pieces(self, pieces: List[str]) -> List[List[str]]:
+        """整批对文本片段分词，数量较多时分发到推理池"""
+        piece_results = None
+        if self.process_pool is not None and self.process_pool.should_fan_out(len(pieces)):
+            try:
+                piece_results = self.process_pool.segment_chunks(pieces)
+            except Exception as e:
+                logger.error(f"多进程分词失败，改为在当前进程分词: {e}")
+        if piece_results is None:
+            piece_results = self._segment_chunks(pieces)
+        return piece_results
+    
+    def _segment_chunks(self, chunks: List[str]) -> List[List[str]]:
+        """整批对文本块分词，失败的文本块使用后备分词"""
+        results: List[List[str]] = [[] for _ in chunks]
+        indices = [i for i, chunk in enumerate(chunks) if chunk.strip()]
+        outputs = self._tokenize_batch([chunks[i] for i in indices])
+        for index, output in zip(indices, outputs):
+            if output is None:
+                logger.error(f"分块处理失败，使用后备分词: {chunks[index][:50]}...")
+                output = self._fallback_segment(chunks[index])
+            results[index] = output
+        return results
+    
+    @staticmethod
+    def _locate_tokens(tokens: List[str], text: str, base: int) -> Optional[List[Tuple[int, int]]]:
+        """按顺序在文本中定位每个词的[起始, 结束)位置，词与原文对不上时返回None"""
+        spans = []
+        position = 0
+        for token in tokens:
+            index = text.find(token, position)
+            if index < 0 or not token:
+                return None
+            spans.append((base + index, base + index + len(token)))
+            position = index + len(token)
+        return spans
+    
+    def _reconcile_overlaps(self, text: str, bounds: List[Tuple[int, int]], windows: List[Tuple[int, int]],
+                            chunk_results: List[List[str]]) -> List[str]:
+        """
+        合并带上下文分词的结果
+
+        每个词归属于其起始位置所在的文本块；跨越块边界的词由前一个块完整输出，
+        后一个块跳过已输出范围内开始的词。若某个词的起点落在已输出范围内、终点超出，
+        只补输出超出的部分，保证原文每个字符恰好被覆盖一次。
+        """
+        results = []
+        emitted_end = bounds[0][0] if bounds else 0
+        for (start, end), (window_start, window_end), tokens in zip(bounds, windows, chunk_results):
+            spans = self._locate_tokens(tokens, text[window_start:window_end], window_start)
+            if spans is None:
+                # 无法对齐时退回只对本块分词
+                logger.warning("分块接缝对齐失败，改为不带上下文分词")
+                core = text[max(start, emitted_end):end]
+                if core:
+                    results.extend(self._segment_chunks([core])[0])
+                emitted_end = max(emitted_end, end)
+                continue
             
+            for token, (token_start, token_end) in zip(tokens, spans):
+                if token_start >= end or token_end <= emitted_end:
+                    continue
+                if token_start < start and token_end <= start:
+                    continue
+                if token_start < emitted_end:
+                    token = text[emitted_end:token_end]
+                results.append(token)
+                emitted_end = token_end
+        return results
+    
+    def iter_long_text_segments(self, text: str, max_len: int = 10000):
+        """
+        逐块对长文本分词，每个文本块完成后立即产出结果（用于流式接口）
+
+        Args:
+            text: 待分词的长文本
+            max_len: 文本块最大字符数
+
+        Yields:
+            Tuple[int, str, List[str]]: (块序号, 块文本, 分词结果)
+        """
+        sentences = self._split_into_sentences(text)
+        for index, chunk in enumerate(self._create_chunks(sentences, max_len)):
+            yield index, chunk, self._segment_chunks([chunk])[0]
+
     def _split_into_sentences(self, text: str) -> List[str]:
-        """按句子边界分割文本"""
-        # 使用中文标点进行分句
-        sentence_delimiters = re.compile(r'([。！？；\n])')
-        sentences = []
-        start = 0
-        for match in sentence_delimiters.finditer(text):
-            sentences.append(text[start:match.end()])
-            start = match.end()
-        if start < len(text):
-            sentences.append(text[start:])
-        return sentences
+        """按句子边界分割文本（保留句末标点，各句拼接后与原文一致）"""
+        return split_sentences(text, strip=False)
     
     def _create_chunks(self, sentences: List[str], max_len: int) -> List[str]:
         """将句子组合成合适大小的文本块"""
@@ -244,11 +521,11 @@ class TextSegmentor:
             words = re.findall(r'[\u4e00-\u9fff]+|\w+', text)  # 改进中文匹配
             return words if words else list(text)
     
-    def segment(self, text: Union[str, List[str]]) -> Union[List[str], List[List[str]]]:
+    def segment(self, text: Union[str, List[str]], engine: Optional[str] = None) -> Union[List[str], List[List[str]]]:
         """通用分词接口，支持单个文本或文本列表"""
         if isinstance(text, str):
-            return self.segment_single(text)
+            return self.segment_single(text, engine=engine)
         elif isinstance(text, list):
-            return self.segment_batch(text)
+            return self.segment_batch(text, engine=engine)
         else:
             raise ValueError(f"不支持的输入类型: {type(text)}")
\ No newline at end of file
@@ -1,12 +1,22 @@
 from torch import nn
-from transformers import BertForSequenceClassification
+from transformers import BertConfig, BertForSequenceClassification
 
 
 class SentimentClassifier(nn.Module):
-    def __init__(self, num_classes=1):
+    def __init__(self, num_classes=1, pretrained=True):
+        """
+        Args:
+            num_classes: 输出类别数
+            pretrained: 是否加载bert-base-chinese预训练权重；为False时只按配置构建随机初始化的模型结构，
+                用于随后整体加载state_dict（例如预量化模型），不下载和构建fp32权重
+        """
         super(SentimentClassifier, self).__init__()
-        self.bert = BertForSequenceClassification.from_pretrained(
-            'bert-base-chinese', num_labels=num_classes)
+        if pretrained:
+            self.bert = BertForSequenceClassification.from_pretrained(
+                'bert-base-chinese', num_labels=num_classes)
+        else:
+            self.bert = BertForSequenceClassification(
+                BertConfig.from_pretrained('bert-base-chinese', num_labels=num_classes))
 
     def forward(self, input_ids, attention_mask, token_type_ids):
         outputs = self.bert(
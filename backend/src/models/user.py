@@ -146,6 +146,9 @@ class APIKey(db.Model):
     
     def to_dict(self):
         """转换为字典格式（不包含实际密钥）"""
+        # 延迟写入缓冲中尚未写入数据库的使用时间总是更新
+        from src.auth.last_used import last_used_recorder
+        last_used_at = last_used_recorder.pending(self.id) or self.last_used_at
         return {
             'id': self.id,
             'user_id': self.user_id,
@@ -155,7 +158,7 @@ class APIKey(db.Model):
             'quota_total': self.quota_total,
             'quota_used': self.quota_used,
             'quota_remaining': self.quota_total - self.quota_used,
-            'last_used_at': format_datetime_for_api(self.last_used_at) if self.last_used_at else None,
+            'last_used_at': format_datetime_for_api(last_used_at) if last_used_at else None,
             'created_at': format_datetime_for_api(self.created_at),
             'updated_at': format_datetime_for_api(self.updated_at)
         }
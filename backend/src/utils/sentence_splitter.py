@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+分句模块
+情感分析和分词共用的预编译分句规则，支持对超长文本或分段输入惰性分句
+"""
+import re
+from typing import Iterable, Iterator, List, Union
+
+# 句末标点：中英文句号/问号/叹号/分号、省略号和换行的连续组合，以及英文省略号（...）；
+# 其后紧跟的右引号和右括号归入当前句。单个英文句点只有后面是空白或文本结尾时才算句末，
+# 避免切开小数和缩写。首个字符用字符类匹配，扫描速度与单字符类正则接近。
+_END_CHARS = r'。！？!?；;…\n'
+_CLOSING = r'[”’"\'」』》）)\]]*'
+SENTENCE_END = re.compile(
+    r'[' + _END_CHARS + r']+' + _CLOSING + r'|\.(?:\.{2,}|(?=\s|$))' + _CLOSING
+)
+# 整句：非句末字符（包括不构成句末的英文句点）加句末标点或文本结尾。
+# 完整文本用一次findall直接取出所有句子，不在Python层逐个匹配切片
+SENTENCE = re.compile(
+    r'[^' + _END_CHARS + r'.]*(?:\.(?!\.{2,}|\s|$)[^' + _END_CHARS + r'.]*)*'
+    r'(?:' + SENTENCE_END.pattern + r'|$)'
+)
+
+
+def _split_text(text: str, strip: bool) -> List[str]:
+    """对完整文本分句"""
+    sentences = SENTENCE.findall(text)
+    # 文本结尾处的空匹配
+    if sentences and not sentences[-1]:
+        sentences.pop()
+    if strip:
+        return [sentence for sentence in map(str.strip, sentences) if sentence]
+    return sentences
+
+
+def iter_sentences(source: Union[str, Iterable[str]], strip: bool = False) -> Iterator[str]:
+    """
+    惰性分句
+
+    Args:
+        source: 文本，或按顺序产出文本片段的可迭代对象（例如逐块读取的大文件）
+        strip: 是否去除每句首尾空白并跳过空句；为False时各句拼接后与原文完全一致
+
+    Returns:
+        Iterator[str]: 句子（保留句末标点）；传入完整文本时一次性分句，片段输入时逐段产出
+    """
+    if isinstance(source, str):
+        return iter(_split_text(source, strip))
+    return _iter_pieces(source, strip)
+
+
+def _iter_pieces(source: Iterable[str], strip: bool) -> Iterator[str]:
+    """对按顺序产出的文本片段惰性分句"""
+    buffer = ''
+    for piece in source:
+        if not piece:
+            continue
+        buffer += piece
+        # 最后一个句末标点之前的部分可以确定分句；位于缓冲区末尾的标点可能在下一个片段继续，留到下一轮
+        last_end = 0
+        for match in SENTENCE_END.finditer(buffer):
+            if match.end() < len(buffer):
+                last_end = match.end()
+        if last_end:
+            yield from _split_text(buffer[:last_end], strip)
+            buffer = buffer[last_end:]
+    if buffer:
+        yield from _split_text(buffer, strip)
+
+
+def split_sentences(text: str, strip: bool = True) -> List[str]:
+    """
+    分句并返回列表
+
+    Args:
+        text: 待分句的文本
+        strip: 是否去除每句首尾空白并跳过空句
+
+    Returns:
+        List[str]: 句子列表
+    """
+    return _split_text(text, strip)